@@ -1,12 +1,33 @@
 # core/build_context.py
 import os
-import json
-from dataclasses import dataclass, asdict, field
+from dataclasses import dataclass, field, fields
 from datetime import datetime
-from typing import Optional
+from functools import lru_cache
+from typing import Dict, Optional
 
+from core import json_util
 
-@dataclass
+
+@lru_cache(maxsize=8)
+def _fmt(dt: datetime) -> str:
+    """
+    格式化为 "YYYY-mm-dd HH:MM:SS"。
+    isoformat 不走 locale，且同一时间点重复格式化时直接命中缓存。
+    """
+    return dt.isoformat(sep=" ", timespec="seconds")
+
+
+@lru_cache(maxsize=8)
+def _fmt_duration(sec: int) -> str:
+    """
+    秒数 -> "X小时Y分Z秒"；只依赖秒数，end_time 不变时重复调用直接命中缓存。
+    """
+    h, rem = divmod(sec, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}小时{m}分{s}秒" if h else (f"{m}分{s}秒" if m else f"{s}秒")
+
+
+@dataclass(slots=True)
 class BuildContext:
     """
     极简构建上下文：用于构建日志、IC 推送、构建产物等。
@@ -37,6 +58,7 @@ class BuildContext:
     # 构建时间
     start_time: datetime = field(default_factory=datetime.now)
     end_time: Optional[datetime] = None
+    timings: Dict[str, float] = field(default_factory=dict)  # 各阶段耗时（秒）
 
     # -------------------------
     # 控制台链接（失败跳用）
@@ -59,30 +81,50 @@ class BuildContext:
         sec = self.duration_seconds()
         if sec is None:
             return "进行中"
+        return _fmt_duration(sec)
 
-        m, s = divmod(sec, 60)
-        h, m = divmod(m, 60)
-        if h > 0:
-            return f"{h}小时{m}分{s}秒"
-        elif m > 0:
-            return f"{m}分{s}秒"
-        return f"{s}秒"
+
+# -------------------------
+# to_dict 用的扁平 asdict（字段固定，导入时生成一次代码，避免反射 + deepcopy）
+# -------------------------
+def _make_fast_asdict():
+    items = ", ".join(f"{f.name!r}: ctx.{f.name}" for f in fields(BuildContext))
+    ns = {}
+    exec(f"def _fast_asdict(ctx):\n    return {{{items}}}\n", ns)
+    return ns["_fast_asdict"]
+
+
+_fast_asdict = _make_fast_asdict()
 
 
 # -------------------------
 # 全局唯一实例
 # -------------------------
 GLOBAL_BUILD_CONTEXT = BuildContext()
+_initialized = False
 
 
 # -------------------------
 # 从 Jenkins 环境变量初始化
 # -------------------------
-def init_from_env(*, overwrite_existing: bool = True) -> BuildContext:
+def init_from_env(
+    *,
+    overwrite_existing: bool = True,
+    force: bool = False,
+) -> BuildContext:
+    """
+    进程内只读取一次环境变量；多个 CLI 入口重复调用时直接返回。
+    force=True 时重新读取。
+    """
+    global _initialized
     ctx = GLOBAL_BUILD_CONTEXT
+    if _initialized and not force:
+        return ctx
+
+    env = os.environ.copy()
 
     def set_env(attr: str, key: str):
-        val = os.getenv(key)
+        val = env.get(key)
         if val is None:
             return
         if overwrite_existing or not getattr(ctx, attr):
@@ -101,6 +143,7 @@ def init_from_env(*, overwrite_existing: bool = True) -> BuildContext:
     set_env("file_server_root", "FILE_SERVER_ROOT")
     set_env("buid_note", "BUILD_NOTE")
     ctx.work_root = os.path.join(ctx.workspace, "work")
+    _initialized = True
     return ctx
 
 
@@ -142,11 +185,10 @@ def mark_build_end():
 # -------------------------
 def to_dict() -> dict:
     ctx = GLOBAL_BUILD_CONTEXT
-    d = asdict(ctx)
+    d = _fast_asdict(ctx)
 
-    d["start_time"] = ctx.start_time.strftime("%Y-%m-%d %H:%M:%S")
-    d["end_time"] = ctx.end_time.strftime(
-        "%Y-%m-%d %H:%M:%S") if ctx.end_time else None
+    d["start_time"] = _fmt(ctx.start_time)
+    d["end_time"] = _fmt(ctx.end_time) if ctx.end_time else None
     d["duration_seconds"] = ctx.duration_seconds()
     d["duration_human"] = ctx.duration_human()
     d["console_text_url"] = ctx.console_text_url()
@@ -155,8 +197,7 @@ def to_dict() -> dict:
 
 
 def dump_to_json(path: str):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(to_dict(), f, ensure_ascii=False, indent=2)
+    json_util.dump_file(path, to_dict(), indent=True)
 
 
 # ---------------------------------------------------------
@@ -164,7 +205,7 @@ def dump_to_json(path: str):
 # ---------------------------------------------------------
 def build_success_summary(*, extra: str) -> str:
     ctx = GLOBAL_BUILD_CONTEXT
-    start = ctx.start_time.strftime("%Y-%m-%d %H:%M:%S")
+    start = _fmt(ctx.start_time)
 
     return (
         f"[status=success "
@@ -181,7 +222,7 @@ def build_success_summary(*, extra: str) -> str:
 # ---------------------------------------------------------
 def build_failure_summary() -> str:
     ctx = GLOBAL_BUILD_CONTEXT
-    start = ctx.start_time.strftime("%Y-%m-%d %H:%M:%S")
+    start = _fmt(ctx.start_time)
     err = ctx.error or "-"
 
     return (
@@ -0,0 +1,53 @@
+# core/json_util.py
+"""
+JSON 读写：装了 orjson 用 orjson（更快、原生支持 dataclass），否则回退标准库 json。
+dumps 统一返回 UTF-8 bytes，非 ASCII 字符不转义。
+"""
+import json
+from dataclasses import asdict, is_dataclass
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时回退到标准库 json
+    orjson = None
+
+
+def _default(obj):
+    # 标准库 json 不认识 dataclass，与 orjson 行为对齐
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def loads(data) -> Any:
+    """
+    解析 JSON（bytes / str），格式错误抛 ValueError。
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj, *, indent: bool = False) -> bytes:
+    """
+    序列化为 UTF-8 JSON bytes；indent=True 时 2 空格缩进。
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else None)
+    return json.dumps(
+        obj, ensure_ascii=False, indent=2 if indent else None, default=_default,
+    ).encode("utf-8")
+
+
+def load_file(path) -> Any:
+    """
+    读取 JSON 文件；文件不存在 / 读失败抛 OSError，格式错误抛 ValueError。
+    """
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def dump_file(path, obj, *, indent: bool = False) -> None:
+    with open(path, "wb") as f:
+        f.write(dumps(obj, indent=indent))
@@ -1,10 +1,29 @@
 import os
 import json
 import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Iterable
+from typing import Callable, Dict, Iterator, List, Iterable, Optional, Tuple
+
+from core import json_util
 
 FILE_HEADER_TMPL = "\n\n===== FILE: {path} =====\n"
+HASH_BUF_SIZE = 64 * 1024
+# bundle 写缓冲：攒满 1 MiB 再一次性 os.write，减少 write 系统调用
+FLUSH_BYTES = 1 << 20
+# 不小于该大小的文件不整读进内存，由写入线程按 HASH_BUF_SIZE 分块流式拷贝
+STREAM_MIN_BYTES = 4 << 20
+# 增量 hash 缓存：{path: [mtime_ns, size, digest]}，mtime/size 不变则复用 digest
+HASH_CACHE_NAME = ".cache.json"
+
+# 读文件 + hash 是 I/O 密集型，线程数可通过环境变量调优
+IO_WORKERS = int(
+    os.getenv("EXPORT_SANDBOX_IO_WORKERS") or (os.cpu_count() or 1) * 4
+)
+# 同时在途（已提交未写出）的读取任务数上限，写入慢时内存不随文件数增长
+IO_WINDOW = IO_WORKERS * 2
 
 
 def load_config(path: str) -> Dict:
@@ -13,13 +32,61 @@ def load_config(path: str) -> Dict:
 
 
 def sha256_short(path: Path, n: int = 12) -> str:
-    h = hashlib.sha256()
     with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(8192), b""):
-            h.update(chunk)
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()[:n]
+
+        # Python < 3.11：复用同一块缓冲区，避免每个 chunk 分配 bytes
+        h = hashlib.sha256()
+        mv = memoryview(bytearray(HASH_BUF_SIZE))
+        while True:
+            size = f.readinto(mv)
+            if not size:
+                break
+            h.update(mv[:size])
     return h.hexdigest()[:n]
 
 
+def load_hash_cache(out_dir: Path) -> Dict[str, list]:
+    path = out_dir / HASH_CACHE_NAME
+    try:
+        return json_util.load_file(path)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_hash_cache(out_dir: Path, cache: Dict[str, list]):
+    json_util.dump_file(out_dir / HASH_CACHE_NAME, cache)
+
+
+def read_and_hash(
+    path: Path,
+    cache: Optional[Dict[str, list]] = None,
+) -> Tuple[Optional[bytes], int, int, str, str]:
+    """
+    读取文件并计算 sha256，返回 (raw, size, mtime_ns, digest, error)。
+    - cache 中 mtime/size 未变时直接复用 digest，不再计算
+    - 大文件（>= STREAM_MIN_BYTES）只 stat，raw 为 None，由写入方流式处理
+    - 读取失败时 raw 为空，error 为错误信息
+    """
+    try:
+        st = os.stat(path)
+        hit = (cache or {}).get(str(path))
+        digest = ""
+        if hit and hit[0] == st.st_mtime_ns and hit[1] == st.st_size:
+            digest = hit[2]
+
+        if st.st_size >= STREAM_MIN_BYTES:
+            return None, st.st_size, st.st_mtime_ns, digest, ""
+        raw = path.read_bytes()
+    except Exception as e:
+        return b"", 0, 0, "-", str(e)
+
+    if not digest:
+        digest = hashlib.sha256(raw).hexdigest()[:12]
+    return raw, len(raw), st.st_mtime_ns, digest, ""
+
+
 def is_under(parent: Path, child: Path) -> bool:
     try:
         child.relative_to(parent)
@@ -29,33 +96,49 @@ def is_under(parent: Path, child: Path) -> bool:
 
 
 def collect_files(root: Path, cfg: Dict) -> List[Path]:
-    include_dirs = [root / d for d in cfg["include"]["dirs"]]
     ex_dirs = set(cfg["exclude"].get("dirs", []))
     ex_files = set(cfg["exclude"].get("files", []))
-    exts = set(cfg["include"]["extensions"])
+    ext_tuple = tuple(cfg["include"]["extensions"])
+
+    def walk(path: str) -> Iterable[str]:
+        # 直接用 scandir：被排除的目录整棵剪掉，不为每个条目构造 Path
+        with os.scandir(path) as it:
+            for entry in it:
+                name = entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in ex_dirs:
+                        yield from walk(entry.path)
+                elif entry.is_file():
+                    if name in ex_files:
+                        continue
+                    if not name.endswith(ext_tuple):
+                        continue
+                    yield entry.path
 
     result: List[Path] = []
 
-    for inc in include_dirs:
-        if not inc.exists():
+    for d in cfg["include"]["dirs"]:
+        inc = root / d
+        if not inc.is_dir():
+            continue
+        if any(part in ex_dirs for part in inc.parts):
             continue
 
-        for p in inc.rglob("*"):
-            if not p.is_file():
-                continue
+        result.extend(Path(p) for p in walk(str(inc)))
 
-            if p.name in ex_files:
-                continue
+    return sorted(result)
 
-            if p.suffix not in exts:
-                continue
 
-            if any(part in ex_dirs for part in p.parts):
-                continue
+def open_for_write(path: Path) -> int:
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    return os.open(path, flags, 0o644)
 
-            result.append(p)
 
-    return sorted(result)
+def write_all(fd: int, data) -> None:
+    mv = memoryview(data)
+    while mv:
+        n = os.write(fd, mv)
+        mv = mv[n:]
 
 
 def ensure_dir(p: Path):
@@ -68,8 +151,26 @@ def write_manifest(out_dir: Path, cfg: Dict, files: List[Path]):
         "file_count": len(files),
         "config": cfg,
     }
-    with open(out_dir / "manifest.json", "w", encoding="utf-8") as f:
-        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    json_util.dump_file(out_dir / "manifest.json", manifest, indent=True)
+
+
+def bounded_map(
+    pool: ThreadPoolExecutor,
+    fn: Callable,
+    items: Iterable,
+    window: int,
+) -> Iterator:
+    """
+    按输入顺序返回 fn(item) 的结果；与 pool.map 不同，
+    最多只有 window 个任务在途，消费方慢时不会把全部结果堆在内存里。
+    """
+    pending = deque()
+    for item in items:
+        if len(pending) >= window:
+            yield pending.popleft().result()
+        pending.append(pool.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
 
 
 def export_bundles(
@@ -78,46 +179,87 @@ def export_bundles(
     files: List[Path],
     max_bytes: int,
     encoding: str,
-):
-    index_lines = []
+    hash_cache: Optional[Dict[str, list]] = None,
+) -> Dict[str, list]:
+    """
+    导出 bundle + index.txt，返回本次所有成功读取文件的新 hash 缓存。
+    """
+    new_cache: Dict[str, list] = {}
+    index_lines: List[str] = [""] * len(files)
     bundle_id = 1
     cur_bytes = 0
-    bundle_path = out_dir / f"bundle_{bundle_id:04d}.txt"
-    bundle_fp = open(bundle_path, "w", encoding=encoding)
+    buf = bytearray()
+    bundle_fd = open_for_write(out_dir / f"bundle_{bundle_id:04d}.txt")
+
+    def flush():
+        write_all(bundle_fd, buf)
+        buf.clear()
 
     def new_bundle():
-        nonlocal bundle_id, cur_bytes, bundle_fp, bundle_path
-        bundle_fp.close()
+        nonlocal bundle_id, cur_bytes, bundle_fd
+        flush()
+        os.close(bundle_fd)
         bundle_id += 1
         cur_bytes = 0
-        bundle_path = out_dir / f"bundle_{bundle_id:04d}.txt"
-        bundle_fp = open(bundle_path, "w", encoding=encoding)
+        bundle_fd = open_for_write(out_dir / f"bundle_{bundle_id:04d}.txt")
 
-    for p in files:
-        rel = p.relative_to(root)
-        header = FILE_HEADER_TMPL.format(path=str(rel))
-        try:
-            content = p.read_text(encoding=encoding)
-        except Exception as e:
-            content = f"<<FAILED TO READ FILE: {e}>>"
-
-        block = header + content
-        size = len(block.encode(encoding))
-
-        if cur_bytes + size > max_bytes:
-            new_bundle()
-
-        bundle_fp.write(block)
-        cur_bytes += size
-
-        index_lines.append(
-            f"{rel}\t{p.stat().st_size}\t{sha256_short(p)}\tbundle_{bundle_id:04d}.txt"
+    # 并发读取 + hash（有界窗口）；按输入顺序返回，bundle 写入仍在主线程串行
+    with ThreadPoolExecutor(max_workers=IO_WORKERS) as pool:
+        loaded = bounded_map(
+            pool, partial(read_and_hash, cache=hash_cache), files, IO_WINDOW
         )
 
-    bundle_fp.close()
+        for i, (p, (raw, size, mtime_ns, digest, error)) in enumerate(
+            zip(files, loaded)
+        ):
+            rel = p.relative_to(root)
+            block = FILE_HEADER_TMPL.format(path=str(rel)).encode(encoding)
+            if error:
+                block += f"<<FAILED TO READ FILE: {error}>>".encode(encoding)
+
+            if cur_bytes + len(block) + size > max_bytes:
+                new_bundle()
+
+            buf += block
+            cur_bytes += len(block)
+
+            if raw is None:
+                # 大文件：分块拷贝，边写边 hash，内存占用与文件大小无关
+                h = None if digest else hashlib.sha256()
+                size = 0
+                with open(p, "rb") as src:
+                    while chunk := src.read(HASH_BUF_SIZE):
+                        if h is not None:
+                            h.update(chunk)
+                        buf += chunk
+                        size += len(chunk)
+                        if len(buf) >= FLUSH_BYTES:
+                            flush()
+                if h is not None:
+                    digest = h.hexdigest()[:12]
+            else:
+                buf += raw
+
+            cur_bytes += size
+            if len(buf) >= FLUSH_BYTES:
+                flush()
+
+            index_lines[i] = (
+                f"{rel}\t{size}\t{digest}\tbundle_{bundle_id:04d}.txt"
+            )
+            if not error:
+                new_cache[str(p)] = [mtime_ns, size, digest]
+
+    flush()
+    os.close(bundle_fd)
+
+    index_fd = open_for_write(out_dir / "index.txt")
+    try:
+        write_all(index_fd, "\n".join(index_lines).encode(encoding))
+    finally:
+        os.close(index_fd)
 
-    with open(out_dir / "index.txt", "w", encoding=encoding) as f:
-        f.write("\n".join(index_lines))
+    return new_cache
 
 
 def main():
@@ -136,13 +278,15 @@ def main():
 
     write_manifest(out_dir, cfg, files)
 
-    export_bundles(
+    hash_cache = export_bundles(
         root=root,
         out_dir=out_dir,
         files=files,
         max_bytes=cfg["bundle"]["max_bytes"],
         encoding=cfg["bundle"].get("encoding", "utf-8"),
+        hash_cache=load_hash_cache(out_dir),
     )
+    save_hash_cache(out_dir, hash_cache)
 
     print(f"[export_sandbox] done. files={len(files)} out={out_dir}")
 
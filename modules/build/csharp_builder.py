@@ -1,16 +1,24 @@
 # -*- coding: utf-8 -*-
 
 import os
+import shlex
 import subprocess
 import logging
+from collections import deque
+from typing import Optional
 
 # 模块级日志（由 CLI / mainbuild 决定 handler）
 logger = logging.getLogger(__name__)
 
+# 结果中保留的 MSBuild 输出尾部行数（完整日志已实时写入 logger）
+OUTPUT_TAIL_LINES = 200
+
 
 class CSharpBuildResult:
     """
     C# 编译结果（结构化返回）
+    stdout：MSBuild 输出（stdout + stderr 合并）的最后 OUTPUT_TAIL_LINES 行
+    stderr：失败时同 stdout 尾部，成功时为空
     """
 
     def __init__(
@@ -39,6 +47,8 @@ def build_csharp(
     configuration: str = "Release",
     restore: bool = True,
     rebuild: bool = True,
+    parallel: Optional[int] = None,
+    graph: bool = False,
 ) -> CSharpBuildResult:
     """
     纯 C# 工程编译（模块级能力）
@@ -46,6 +56,10 @@ def build_csharp(
     - 不 exit
     - 不关心 Jenkins / Git / SVN
     - 通过返回值判断成功或失败
+
+    parallel：MSBuild 并行节点数（/m:N），None 表示不开启
+    graph   ：按静态项目依赖图调度（/graph），多核利用率更高；
+              此时 restore 改用 /restore 开关（须在图求值前完成）
     """
 
     logger.info("========== CSharp Build Start ==========")
@@ -54,6 +68,8 @@ def build_csharp(
     logger.info("Configuration: %s", configuration)
     logger.info("Restore      : %s", restore)
     logger.info("Rebuild      : %s", rebuild)
+    logger.info("Parallel     : %s", parallel or "-")
+    logger.info("Graph        : %s", graph)
 
     # ---------- 参数校验 ----------
     if not os.path.isfile(msbuild_path):
@@ -82,43 +98,49 @@ def build_csharp(
 
     # ---------- 组装 MSBuild 命令 ----------
     targets = []
-    if restore:
+    if restore and not graph:
         targets.append("Restore")
     targets.append("Rebuild" if rebuild else "Build")
 
-    target_arg = "/t:" + ";".join(targets)
-    prop_arg = f"/p:Configuration={configuration}"
-
-    command = (
-        f"\"{msbuild_path}\" "
-        f"\"{project_path}\" "
-        f"{target_arg} "
-        f"{prop_arg}"
-    )
+    argv = [
+        msbuild_path,
+        project_path,
+        "/t:" + ";".join(targets),
+        f"/p:Configuration={configuration}",
+    ]
+    if restore and graph:
+        argv.append("/restore")
+    if parallel:
+        argv.append(f"/m:{parallel}")
+    if graph:
+        argv.append("/graph")
+    # 仅用于日志与结果展示，实际执行不经过 shell
+    command = shlex.join(argv)
 
     logger.info("Execute CMD  : %s", command)
 
     # ---------- 执行 ----------
+    # stderr 合并进 stdout，逐行实时输出，内存中只保留尾部若干行
     process = subprocess.Popen(
-        command,
-        shell=True,
+        argv,
         stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        bufsize=1,
         text=True,
         encoding="utf-8",
         errors="ignore",
     )
 
-    stdout, stderr = process.communicate()
-    returncode = process.returncode
-
-    if stdout:
-        logger.info("----- MSBuild STDOUT -----")
-        logger.info(stdout)
+    tail = deque(maxlen=OUTPUT_TAIL_LINES)
+    logger.info("----- MSBuild OUTPUT -----")
+    for line in iter(process.stdout.readline, ""):
+        line = line.rstrip()
+        logger.info(line)
+        tail.append(line)
+    process.stdout.close()
 
-    if stderr:
-        logger.error("----- MSBuild STDERR -----")
-        logger.error(stderr)
+    returncode = process.wait()
+    stdout = "\n".join(tail)
 
     success = returncode == 0
 
@@ -134,7 +156,7 @@ def build_csharp(
         success=success,
         returncode=returncode,
         stdout=stdout,
-        stderr=stderr,
+        stderr="" if success else stdout,
         command=command,
         project_path=project_path,
     )
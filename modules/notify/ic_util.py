@@ -1,11 +1,21 @@
 # ic_util.py
 import requests
-from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 logger = logging.getLogger(__name__)
 
 IC_API_URL = "https://im-api.skyunion.net/msg"
 
+# 复用 TCP/TLS 连接：一次构建内的多条通知不再重复握手
+# Retry 默认不重试 POST 的读错误，只重试连接失败，避免重复推送
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=2, backoff_factor=0.1),
+))
+
 
 def _clean(x):
     if x is None:
@@ -16,19 +26,16 @@ def _clean(x):
 
 
 def _post(payload):
-
-    payload_json = str(payload)
-
-    logger.info("ic_util._post payload: %s", payload_json)
+    logger.info("ic_util._post payload: %s", payload)
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    resp = requests.post(IC_API_URL, data=urlencode(
-        payload), headers=headers, timeout=5)
+    resp = _SESSION.post(IC_API_URL, data=payload,
+                         headers=headers, timeout=5)
 
-    resp_json = str(resp)
     try:
         resp_json = resp.json()
     except Exception:
         logger.exception("_post resp.json() failed")
+        resp_json = str(resp)
     logger.info("ic_util._post return：: %s", resp_json)
     return resp_json
 
@@ -13,6 +13,8 @@ Git 工具链（终极版）
 import os
 import subprocess
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import List, Dict, Optional
 
 # =========================================================
@@ -58,7 +60,12 @@ def get_default_ssh_key() -> str:
     raise GitError("未找到可用的 SSH key")
 
 
+@lru_cache(maxsize=4)
 def _build_ssh_env(ssh_key: Optional[str]) -> dict:
+    """
+    按 ssh_key 缓存 git 子进程环境，避免每次 run_git 都复制 os.environ
+    并重新探测 key 文件。返回的 dict 被共享，调用方不要修改。
+    """
     key = ssh_key or get_default_ssh_key()
     if not os.path.exists(key):
         raise GitError(f"SSH key 不存在: {key}")
@@ -71,6 +78,8 @@ def _build_ssh_env(ssh_key: Optional[str]) -> dict:
         "-o StrictHostKeyChecking=no "
         f"-o UserKnownHostsFile={null_dev}"
     )
+    # 只读查询（status / log 等）不抢 index.lock
+    env["GIT_OPTIONAL_LOCKS"] = "0"
     return env
 
 # =========================================================
@@ -82,14 +91,19 @@ def run_git(
     args: List[str],
     cwd: Optional[str] = None,
     ssh_key: Optional[str] = None,
+    extra_env: Optional[Dict[str, str]] = None,
 ) -> str:
     cmd = ["git"] + args
     logger.info(f"[git] {' '.join(cmd)} (cwd={cwd})")
 
+    env = _build_ssh_env(ssh_key)
+    if extra_env:
+        env = {**env, **extra_env}
+
     proc = subprocess.run(
         cmd,
         cwd=cwd,
-        env=_build_ssh_env(ssh_key),
+        env=env,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         text=True,
@@ -113,12 +127,37 @@ def _ensure_repo(path: str):
 
 
 def clone(url: str, dest: str, branch: str = None,
-          recursive=True, lfs=True, ssh_key=None):
+          recursive=True, lfs=True, ssh_key=None,
+          *, shallow: bool = False, blob_filter: Optional[str] = None,
+          lfs_include: Optional[List[str]] = None):
+    """
+    shallow=True     : 只取最新提交（--depth 1 --no-tags，submodule 同样浅克隆）；
+                       带 --no-single-branch，之后仍可切换到其他分支
+    blob_filter      : partial clone 过滤器（如 "blob:none"），文件内容按需下载；
+                       之后的 fetch 会沿用 clone 时记录的过滤器
+    lfs_include      : 只拉取这些路径下的 LFS 文件（clone 时跳过 smudge，
+                       之后一次 git lfs pull --include）
+    """
     args = ["clone", url, dest]
     if branch:
         args += ["-b", branch]
     if recursive:
         args.append("--recursive")
+    if shallow:
+        # --depth 隐含 --single-branch，fetch refspec 只剩初始分支
+        args += ["--depth", "1", "--no-tags", "--no-single-branch"]
+        if recursive:
+            args.append("--shallow-submodules")
+    if blob_filter:
+        args.append(f"--filter={blob_filter}")
+
+    if lfs and lfs_include:
+        run_git(args, ssh_key=ssh_key, extra_env=LFS_SKIP_SMUDGE_ENV)
+        lfs_install(dest, ssh_key, skip_smudge=True)
+        lfs_pull(dest, ssh_key, include=lfs_include)
+        if recursive:
+            lfs_pull_all_submodules(dest, ssh_key)
+        return
 
     run_git(args, ssh_key=ssh_key)
 
@@ -127,9 +166,29 @@ def clone(url: str, dest: str, branch: str = None,
         lfs_pull(dest, ssh_key)
 
 
-def fetch(path: str, ssh_key=None):
+def fetch(path: str, ssh_key=None, *, depth: Optional[int] = None):
     _ensure_repo(path)
-    run_git(["fetch", "--all"], cwd=path, ssh_key=ssh_key)
+    args = ["fetch", "--all"]
+    if depth:
+        args += [f"--depth={depth}", "--no-tags"]
+    run_git(args, cwd=path, ssh_key=ssh_key)
+
+
+def fetch_branch(path: str, branch: str, ssh_key=None, *, depth: Optional[int] = None):
+    """
+    显式拉取 origin 上的指定分支；single-branch 克隆会先把该分支加入 fetch refspec，
+    之后的 fetch / checkout 才能识别它
+    """
+    _ensure_repo(path)
+    refspec = f"+refs/heads/{branch}:refs/remotes/origin/{branch}"
+    specs = run_git(["config", "--get-all", "remote.origin.fetch"], cwd=path, ssh_key=ssh_key)
+    if refspec not in specs.split() and "+refs/heads/*:refs/remotes/origin/*" not in specs.split():
+        run_git(["remote", "set-branches", "--add", "origin", branch], cwd=path, ssh_key=ssh_key)
+
+    args = ["fetch", "origin", refspec]
+    if depth:
+        args += [f"--depth={depth}", "--no-tags"]
+    run_git(args, cwd=path, ssh_key=ssh_key)
 
 
 def checkout(path: str, target: str, ssh_key=None):
@@ -151,23 +210,45 @@ def submodule_sync(path: str, ssh_key=None):
     run_git(["submodule", "sync", "--recursive"], cwd=path, ssh_key=ssh_key)
 
 
-def submodule_update(path: str, ssh_key=None):
+def submodule_update(path: str, ssh_key=None, *, depth: Optional[int] = None):
     _ensure_repo(path)
-    run_git(["submodule", "update", "--init", "--recursive"],
-            cwd=path, ssh_key=ssh_key)
+    args = ["submodule", "update", "--init", "--recursive"]
+    if depth:
+        args += ["--depth", str(depth)]
+    run_git(args, cwd=path, ssh_key=ssh_key)
 
 # =========================================================
 # LFS
 # =========================================================
 
 
-def lfs_install(path: str, ssh_key=None):
+# clone / checkout 时不下载 LFS 文件，只留指针，之后再按需 lfs pull
+LFS_SKIP_SMUDGE_ENV = {"GIT_LFS_SKIP_SMUDGE": "1"}
+
+
+def lfs_install(path: str, ssh_key=None, *, skip_smudge: bool = False):
+    """
+    skip_smudge=True：在本仓库配置中关闭 smudge（git lfs install --local --skip-smudge），
+    之后的 checkout / pull 都只写指针文件。
+    """
     _ensure_repo(path)
-    run_git(["lfs", "install"], cwd=path, ssh_key=ssh_key)
+    args = ["lfs", "install"]
+    if skip_smudge:
+        args += ["--local", "--skip-smudge"]
+    run_git(args, cwd=path, ssh_key=ssh_key)
 
 
-def lfs_pull(path: str, ssh_key=None):
+def lfs_pull(path: str, ssh_key=None, *, include: Optional[List[str]] = None):
+    """
+    include 为空：拉取全部 LFS 对象；
+    否则只拉取并检出这些路径下的 LFS 文件（git lfs pull --include）。
+    """
     _ensure_repo(path)
+    if include:
+        run_git(["lfs", "pull", "--include", ",".join(include)],
+                cwd=path, ssh_key=ssh_key)
+        return
+
     run_git(["lfs", "fetch", "--all"], cwd=path, ssh_key=ssh_key)
     run_git(["lfs", "pull"], cwd=path, ssh_key=ssh_key)
 
@@ -226,14 +307,22 @@ def get_commits_between(path: str, a: str, b: str) -> List[Dict]:
     if a == b:
         return []
 
-    fmt = "%H|%an|%ae|%ad|%s"
+    # 先用 rev-list 计数，区间为空时不再跑 git log
+    count = run_git(["rev-list", "--count", f"{a}..{b}"], cwd=path)
+    if int(count or 0) == 0:
+        return []
+
+    # 字段与提交之间都用 NUL 分隔，提交信息里含 "|" 也能正确解析
+    fmt = "%H%x00%an%x00%ae%x00%ad%x00%s"
     out = run_git(
-        ["log", f"{a}..{b}", f"--pretty=format:{fmt}", "--date=iso"],
+        ["log", f"{a}..{b}", f"--pretty=format:{fmt}", "--date=iso",
+         "--no-renames", "-z"],
         cwd=path,
     )
+    fields = out.split("\0") if out else []
     commits = []
-    for line in out.splitlines():
-        h, an, ae, ad, msg = line.split("|", 4)
+    for i in range(0, len(fields) - 4, 5):
+        h, an, ae, ad, msg = fields[i:i + 5]
         commits.append({
             "commit": h,
             "author": an,
@@ -259,6 +348,16 @@ def get_submodule_states(path: str) -> Dict[str, str]:
             result[sub_path] = commit
     return result
 
+
+def _get_head_and_submodules(path: str):
+    """
+    并发获取 (HEAD, {submodule_path: commit})
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        head = pool.submit(get_head, path)
+        subs = pool.submit(get_submodule_states, path)
+        return head.result(), subs.result()
+
 # =========================================================
 # update with info (核心)
 # =========================================================
@@ -274,6 +373,9 @@ def update_repo(
     *,
     reset: bool = True,
     clean: bool = True,
+    shallow: bool = False,
+    blob_filter: Optional[str] = None,
+    lfs_include: Optional[List[str]] = None,
 ) -> Dict:
     """
     更新仓库，并返回本次更新的详细信息：
@@ -284,16 +386,29 @@ def update_repo(
     - reset=True  : 执行 git reset --hard（主仓库 + submodule）
     - clean=True  : 执行 git clean -fd（主仓库 + submodule）
     默认二者都 False（安全）
+    - shallow=True     : 浅克隆 / 浅更新（只取最新提交），适合只构建最新代码的 CI；
+                         更新时直接对齐到上游（reset=True 时 reset --hard @{u}，
+                         否则 reset --keep @{u}，有冲突的本地修改会让更新失败），
+                         返回的提交列表只包含已拉取深度内的提交
+    - blob_filter      : 首次 clone 时的 partial clone 过滤器（如 "blob:none"）
+    - lfs_include      : 主仓库只拉取这些路径下的 LFS 文件（跳过 smudge + lfs pull --include）
     """
 
     # ---------- before ----------
-    main_before = get_head(dest) if os.path.exists(dest) else None
-    subs_before = get_submodule_states(dest) if main_before else {}
+    main_before, subs_before = (
+        _get_head_and_submodules(dest) if os.path.exists(dest) else (None, {})
+    )
 
     # ---------- update ----------
     if not os.path.exists(dest):
-        clone(url, dest, branch, recursive, lfs, ssh_key)
+        clone(url, dest, branch, recursive, lfs, ssh_key,
+              shallow=shallow, blob_filter=blob_filter,
+              lfs_include=lfs_include)
     else:
+        if lfs and lfs_include:
+            # 先关 smudge，后面的 checkout / pull 不再下载全部 LFS 文件
+            lfs_install(dest, ssh_key, skip_smudge=True)
+
         # ====== 破坏性操作（显式 opt-in） ======
         if reset:
             logger.warning("[git_ops] reset --hard（主仓库）")
@@ -320,49 +435,75 @@ def update_repo(
                 )
 
         # ====== 正常更新流程 ======
+        depth = 1 if shallow else None
         if branch:
+            if shallow:
+                # 旧的浅克隆可能是 single-branch，先显式拉取目标分支
+                fetch_branch(dest, branch, ssh_key, depth=depth)
             checkout(dest, branch, ssh_key)
 
-        fetch(dest, ssh_key)
-        pull(dest, ssh_key)
+        fetch(dest, ssh_key, depth=depth)
+        if shallow:
+            # 浅历史无法可靠 merge，直接对齐到上游分支；
+            # 未要求 reset 时用 --keep，不丢弃本地修改
+            mode = "--hard" if reset else "--keep"
+            run_git(["reset", mode, "@{u}"], cwd=dest, ssh_key=ssh_key)
+        else:
+            pull(dest, ssh_key)
 
         if recursive:
             submodule_sync(dest, ssh_key)
-            submodule_update(dest, ssh_key)
+            submodule_update(dest, ssh_key, depth=depth)
 
-        if lfs:
+        if lfs and lfs_include:
+            lfs_pull(dest, ssh_key, include=lfs_include)
+            lfs_pull_all_submodules(dest, ssh_key)
+        elif lfs:
             lfs_install(dest, ssh_key)
             lfs_pull(dest, ssh_key)
             lfs_pull_all_submodules(dest, ssh_key)
 
     # ---------- after ----------
-    main_after = get_head(dest)
-    subs_after = get_submodule_states(dest)
-
-    info = {
-        "repo": {
-            "path": dest,
-            "from": main_before,
-            "to": main_after,
-            "commits": (
-                get_commits_between(dest, main_before, main_after)
-                if main_before else []
-            ),
-        },
-        "submodules": [],
-    }
+    main_after, subs_after = _get_head_and_submodules(dest)
 
+    changed_subs = []
     for sub_path, new_commit in subs_after.items():
         old_commit = subs_before.get(sub_path)
         if old_commit and old_commit != new_commit:
-            full_path = os.path.join(dest, sub_path)
+            changed_subs.append((sub_path, old_commit, new_commit))
+
+    # 主仓库 + 各 submodule 的提交查询互不依赖，并发执行
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        main_commits = (
+            pool.submit(get_commits_between, dest, main_before, main_after)
+            if main_before else None
+        )
+        sub_commits = [
+            pool.submit(
+                get_commits_between,
+                os.path.join(dest, sub_path), old_commit, new_commit,
+            )
+            for sub_path, old_commit, new_commit in changed_subs
+        ]
+
+        info = {
+            "repo": {
+                "path": dest,
+                "from": main_before,
+                "to": main_after,
+                "commits": main_commits.result() if main_commits else [],
+            },
+            "submodules": [],
+        }
+
+        for (sub_path, old_commit, new_commit), fut in zip(
+            changed_subs, sub_commits
+        ):
             info["submodules"].append({
                 "path": sub_path,
                 "from": old_commit,
                 "to": new_commit,
-                "commits": get_commits_between(
-                    full_path, old_commit, new_commit
-                ),
+                "commits": fut.result(),
             })
 
     return info
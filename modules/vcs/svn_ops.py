@@ -11,16 +11,57 @@
 
 from __future__ import annotations
 
+import asyncio
+import heapq
 import logging
 import os
+import re
+import shlex
+import stat
 import subprocess
-import shutil
+import tempfile
+import threading
 import json
-import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import List, Optional, Tuple
+from functools import lru_cache
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from core import json_util
+
+try:
+    # lxml 基于 libxml2，解析大段 svn log --xml 明显更快、更省内存
+    from lxml import etree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+
 logger = logging.getLogger(__name__)
 
+# collect_change_summary 并发扫描 external / 拉 diff 的线程上限
+# （受 SVN 服务端并发能力限制，不宜过大）
+MAX_SCAN_WORKERS = 16
+MAX_DIFF_WORKERS = 8
+# ensure_sparse_workspace 并发 checkout 的 project 数上限
+MAX_CHECKOUT_WORKERS = 8
+
+# 进程内同时运行的 svn 子进程上限（_svn / _svn_async / _svn_stream / _iter_log_entries 共用）。
+# 各处线程池会嵌套（external 扫描 × diff），只限线程数挡不住子进程总数
+MAX_SVN_PROCS = 16
+_SVN_PROC_SLOTS = threading.BoundedSemaphore(MAX_SVN_PROCS)
+
+# get_revision_list 分页大小（svn log --limit）
+LOG_PAGE_SIZE = 500
+
+# svnversion 输出："4168" / "4123:4168" / "4168MS" 等（M 本地修改，S switched，P 部分检出）
+_SVNVERSION_RE = re.compile(r"(\d+)(?::(\d+))?([MSP]*)$")
+
+# 只在工作副本中有意义的 revision 关键字（log 无法改走 URL）
+_WC_REV_KEYWORDS = ("BASE", "COMMITTED", "PREV")
+
+# get_externals 解析结果缓存（位于 .svn 下，按 wc.db 的 mtime 失效）
+EXTERNALS_CACHE_NAME = "buildflow_externals_cache.json"
+
 
 # ----------------------------------------------------------------------
 # 基础异常类型
@@ -35,7 +76,7 @@ class VCSException(Exception):
 # 用于记录变更的结构体
 # ----------------------------------------------------------------------
 
-@dataclass
+@dataclass(slots=True)
 class FileChange:
     """
     单个文件的变更信息。
@@ -51,7 +92,7 @@ class FileChange:
     diff: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class RevisionChange:
     """
     单个 SVN revision 的变更信息。
@@ -64,7 +105,7 @@ class RevisionChange:
     files: List[FileChange]
 
 
-@dataclass
+@dataclass(slots=True)
 class UpdateResult:
     """
     一次 update 的整体结果。
@@ -76,6 +117,13 @@ class UpdateResult:
     to_rev: str
     revision_changes: List[RevisionChange]
 
+    def to_json(self) -> bytes:
+        """
+        序列化为 UTF-8 JSON（用于构建记录、IC 推送）。
+        装了 orjson 时原生序列化 dataclass（含 slots），不经过 asdict 的深拷贝。
+        """
+        return json_util.dumps(self)
+
 
 @dataclass
 class SvnSparseProfile:
@@ -94,19 +142,24 @@ def run_cmd(
     args: List[str],
     cwd: Optional[str] = None,
     check: bool = False,
+    capture: bool = True,
 ) -> Tuple[int, str, str]:
     """
     执行命令行工具，并捕获 stdout / stderr。
 
     check=True 时表示遇到非 0 退出码会抛出异常。
+    capture=False 时 stdout 直接丢弃（返回 ""），只捕获 stderr，
+    用于 add / delete 这类逐文件回显、结果无人读取的命令。
     """
-    if logger:
+    # 大段 svn log 输出上 join / strip 也不便宜，只在 DEBUG 开启时才做
+    debug = logger.isEnabledFor(logging.DEBUG)
+    if debug:
         logger.debug("执行命令: %s (cwd=%s)", " ".join(args), cwd)
 
     proc = subprocess.run(
         args,
         cwd=cwd,
-        stdout=subprocess.PIPE,
+        stdout=subprocess.PIPE if capture else subprocess.DEVNULL,
         stderr=subprocess.PIPE,
         text=True,
         encoding="utf-8",
@@ -117,7 +170,7 @@ def run_cmd(
     out = proc.stdout or ""
     err = proc.stderr or ""
 
-    if logger:
+    if debug:
         logger.debug("退出码: %s", proc.returncode)
         if out.strip():
             logger.debug("STDOUT:\n%s", out)
@@ -134,6 +187,277 @@ def run_cmd(
     return proc.returncode, out, err
 
 
+async def run_cmd_async(
+    args: List[str],
+    cwd: Optional[str] = None,
+) -> Tuple[int, str, str]:
+    """
+    run_cmd 的 asyncio 版本：子进程由事件循环调度，不占线程。
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("执行命令(async): %s (cwd=%s)", " ".join(args), cwd)
+
+    proc = await asyncio.create_subprocess_exec(
+        *args,
+        cwd=cwd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    out, err = await proc.communicate()
+    return (
+        proc.returncode,
+        out.decode("utf-8", errors="ignore"),
+        err.decode("utf-8", errors="ignore"),
+    )
+
+
+def run_cmd_stream(
+    args: List[str],
+    cwd: Optional[str] = None,
+) -> Tuple[subprocess.Popen, IO[bytes]]:
+    """
+    启动命令，返回 (Popen, stderr 临时文件)；stdout 为二进制管道。
+
+    用于大输出（svn log --xml 等）：调用方直接把 proc.stdout 交给解析器，
+    不经过整段 str 的解码与再编码；读完后由调用方 wait() 并检查 returncode，
+    stderr 用 _read_stderr() 读取。
+    stderr 不走管道：stdout 未读完前没人读 stderr，输出多时子进程会阻塞。
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("执行命令(流式): %s (cwd=%s)", " ".join(args), cwd)
+
+    errf = tempfile.TemporaryFile()
+    try:
+        proc = subprocess.Popen(
+            args,
+            cwd=cwd,
+            stdout=subprocess.PIPE,
+            stderr=errf,
+        )
+    except BaseException:
+        errf.close()
+        raise
+    return proc, errf
+
+
+def _read_stderr(f: IO[bytes]) -> str:
+    """
+    读取并关闭 stderr 临时文件（需在子进程 wait() 之后调用）
+    """
+    try:
+        f.seek(0)
+        return f.read().decode("utf-8", errors="ignore")
+    finally:
+        f.close()
+
+
+_DIFF_INDEX_RE = re.compile(r"^Index: ", re.MULTILINE)
+
+
+def _parse_logentry(entry) -> RevisionChange:
+    """
+    把 svn log -v --xml 的一个 <logentry> 转成 RevisionChange（不含 diff）。
+    revision / action 属性 svn 总会输出，直接按键取值。
+    """
+    files = []
+    paths = entry.find("paths")
+    if paths is not None:
+        for p in paths.iter("path"):
+            text = (p.text or "").strip()
+            if text:
+                files.append(FileChange(path=text, action=p.attrib["action"]))
+
+    return RevisionChange(
+        revision=entry.attrib["revision"],
+        author=(entry.findtext("author") or "").strip(),
+        date=(entry.findtext("date") or "").strip(),
+        message=(entry.findtext("msg") or "").strip(),
+        files=files,
+    )
+
+
+def _truncate_lines(text: str, max_lines: int) -> str:
+    lines = text.splitlines()
+    if len(lines) > max_lines:
+        part = lines[:max_lines]
+        part.append(
+            f"...(剩余 {len(lines) - max_lines} 行已截断)"
+        )
+        return "\n".join(part)
+
+    return text
+
+
+def _lookup_diff(diffs: Dict[str, str], repo_path: str) -> str:
+    """
+    svn log 给出的是仓库路径（/trunk/Proj/a.cs），
+    svn diff 的 Index 是工作副本相对路径（a.cs），按路径后缀匹配。
+    逐级去掉前导目录查 dict（最长后缀优先），代价只与路径深度有关，
+    不随 diff 文件数增长。
+    """
+    hit = diffs.get(repo_path)
+    if hit is not None:
+        return hit
+    i = repo_path.find("/")
+    while i != -1:
+        hit = diffs.get(repo_path[i + 1:])
+        if hit is not None:
+            return hit
+        i = repo_path.find("/", i + 1)
+    return ""
+
+
+def _read_json_file(path: str):
+    try:
+        return json_util.load_file(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json_file(path: str, obj):
+    try:
+        json_util.dump_file(path, obj)
+    except OSError:
+        logger.debug("写入缓存失败: %s", path)
+
+
+def _fast_rmtree(path: str):
+    """
+    递归删除目录（尽力而为，出错忽略，语义同 shutil.rmtree(ignore_errors=True)）。
+
+    基于 os.scandir：DirEntry.is_dir(follow_symlinks=False) 直接使用目录项类型，
+    大目录（十万级资源文件）下省去逐项 stat。
+    只读文件（Windows 上常见）先去掉只读属性再重试一次。
+    """
+    try:
+        with os.scandir(path) as it:
+            entries = list(it)
+    except OSError:
+        entries = []
+
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            is_dir = False
+
+        if is_dir:
+            _fast_rmtree(entry.path)
+            continue
+
+        try:
+            os.unlink(entry.path)
+        except PermissionError:
+            try:
+                os.chmod(entry.path, stat.S_IWRITE)
+                os.unlink(entry.path)
+            except OSError:
+                pass
+        except OSError:
+            pass
+
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
+
+
+def _external_local_path(definition: str) -> Optional[str]:
+    """
+    从一行 svn:externals 定义中取出本地路径。
+    支持两种格式：
+        新格式：[-r N] URL[@PEG] LOCAL
+        旧格式：LOCAL [-r N] URL
+    """
+    definition = definition.strip()
+    if not definition or definition.startswith("#"):
+        return None
+
+    # 绝大多数定义不含引号 / 转义，直接 str.split，避免 shlex 的逐字符词法分析
+    if '"' in definition or "'" in definition or "\\" in definition:
+        try:
+            parts = shlex.split(definition)
+        except ValueError:
+            parts = definition.split()
+    else:
+        parts = definition.split()
+
+    tokens = []
+    skip = False
+    for t in parts:
+        if skip:
+            skip = False
+            continue
+        if t == "-r":
+            skip = True
+            continue
+        if t.startswith("-r"):
+            continue
+        tokens.append(t)
+
+    if len(tokens) < 2:
+        return None
+
+    first = tokens[0]
+    if "://" in first or first.startswith(("^/", "//", "/", "../")):
+        return tokens[-1]
+    return first
+
+
+def normalize_sparse_profile(profile: Dict) -> Dict:
+    """
+    规范化 sparse profile：每条 paths 统一为 {"path": 去掉首尾 "/", "depth": 默认 infinity}。
+    返回新 dict，不修改传入的（缓存共享的）对象；格式错误在加载时即报出。
+    """
+    projects = {}
+    for name, proj in (profile.get("projects") or {}).items():
+        paths = []
+        for item in proj.get("paths") or []:
+            if not isinstance(item, dict) or not item.get("path"):
+                raise VCSException(f"profile 路径规则非法: {name}: {item}")
+            paths.append({
+                **item,
+                "path": item["path"].strip("/"),
+                "depth": item.get("depth", "infinity"),
+            })
+        projects[name] = {**proj, "paths": paths}
+    return {**profile, "projects": projects}
+
+
+@lru_cache(maxsize=8)
+def _load_sparse_profile_cached(path: str, mtime_ns: int) -> Dict:
+    return normalize_sparse_profile(json_util.load_file(path))
+
+
+def load_sparse_profile(path: str) -> Dict:
+    """
+    读取并规范化 sparse profile（JSON）；按 (path, mtime) 缓存，
+    文件修改后自动重新解析。返回的是共享对象，调用方不要原地修改。
+    """
+    return _load_sparse_profile_cached(path, os.stat(path).st_mtime_ns)
+
+
+def sparse_update_batches(paths: List[dict]) -> List[Tuple[str, List[str]]]:
+    """
+    把 sparse 规则合并成若干次 svn update 调用：[(depth, [rel, ...]), ...]
+
+    先按路径层级（父 → 子）、再按 depth 排序，然后把相邻且 depth 相同的
+    路径合并为一批；svn update 按 target 顺序处理，父目录总在子目录之前展开。
+    paths 须已规范化（path 去掉首尾 "/"、depth 已补默认值，见 normalize_sparse_profile）。
+    """
+    items = sorted(
+        (item["path"].count("/"), item["depth"], item["path"]) for item in paths
+    )
+
+    batches: List[Tuple[str, List[str]]] = []
+    for _, depth, rel in items:
+        if batches and batches[-1][0] == depth:
+            batches[-1][1].append(rel)
+        else:
+            batches.append((depth, [rel]))
+    return batches
+
+
 # ----------------------------------------------------------------------
 # SvnOps 主类
 # ----------------------------------------------------------------------
@@ -144,6 +468,9 @@ class SvnOps:
     稀疏检出以及构建流水线自动化。
     """
 
+    # svn cleanup 是否支持 --remove-unversioned（None = 尚未探测）
+    _cleanup_remove_unversioned_supported: Optional[bool] = None
+
     def __init__(self, repo_path: str):
         self.repo_path = repo_path
 
@@ -151,20 +478,39 @@ class SvnOps:
         self.before_update_rev: Optional[str] = None
         self.after_update_rev: Optional[str] = None
 
+        # 查询缓存：revision 时间不会变；URL / externals 在 update / switch 后失效
+        self._rev_time_cache: Dict[str, str] = {}
+        self._url_cache: Optional[str] = None
+        self._all_externals_cache: Optional[List[str]] = None
+
     # ------------------------------------------------------------------
     # 内部封装 svn 命令，并处理工作副本锁定
     # ------------------------------------------------------------------
 
-    def _svn(self, args: List[str], check: bool = False):
+    def _svn(
+        self,
+        args: List[str],
+        check: bool = False,
+        *,
+        in_wc: bool = True,
+        capture: bool = True,
+    ):
         """
         执行 svn 命令。
         若遇到工作副本锁定（E155004），会自动 cleanup 后再重试。
+
+        in_wc=False：命令直接作用于 URL（不依赖工作副本），
+        不在工作副本目录下执行，也不做锁定重试。
+        capture=False：丢弃 stdout（返回 ""）；stderr 仍捕获，锁定重试照常。
         """
         cmd = ["svn"] + args
-        logger.info("执行 SVN 命令: %s", " ".join(cmd))
-        code, out, err = run_cmd(
-            cmd, cwd=self.repo_path, check=False
-        )
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("执行 SVN 命令: %s", " ".join(cmd))
+        with _SVN_PROC_SLOTS:
+            code, out, err = run_cmd(
+                cmd, cwd=self.repo_path if in_wc else None, check=False,
+                capture=capture,
+            )
 
         locked = (
             "is locked" in err
@@ -172,13 +518,59 @@ class SvnOps:
             or "run 'svn cleanup'" in err
         )
 
-        if code != 0 and locked:
+        if code != 0 and locked and in_wc:
             logger.warning("工作副本被锁定，执行 cleanup 后重试。")
             self.cleanup(aggressive=False)
-            code, out, err = run_cmd(
-                cmd, cwd=self.repo_path, check=False
+            with _SVN_PROC_SLOTS:
+                code, out, err = run_cmd(
+                    cmd, cwd=self.repo_path, check=False, capture=capture
+                )
+
+        if check and code != 0:
+            raise VCSException(
+                f"svn 执行失败: {' '.join(cmd)}\n"
+                f"退出码: {code}\nOUT:\n{out}\nERR:\n{err}"
             )
 
+        return code, out, err
+
+    async def _run_async_slotted(self, cmd: List[str]) -> Tuple[int, str, str]:
+        """
+        占用一个全局 svn 进程名额后执行 run_cmd_async，与线程侧的 _svn 共用上限。
+        """
+        acquire = asyncio.ensure_future(asyncio.to_thread(_SVN_PROC_SLOTS.acquire))
+        try:
+            await asyncio.shield(acquire)
+        except asyncio.CancelledError:
+            # 等待中被取消：名额稍后仍会拿到，拿到即归还
+            acquire.add_done_callback(lambda _: _SVN_PROC_SLOTS.release())
+            raise
+        try:
+            return await run_cmd_async(cmd, cwd=self.repo_path)
+        finally:
+            _SVN_PROC_SLOTS.release()
+
+    async def _svn_async(self, args: List[str], check: bool = False):
+        """
+        _svn 的 asyncio 版本（同样处理工作副本锁定：cleanup 后重试一次）。
+        用于跨工作副本大量并发 svn 调用；并发上限即全局的 MAX_SVN_PROCS。
+        """
+        cmd = ["svn"] + args
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("执行 SVN 命令: %s", " ".join(cmd))
+        code, out, err = await self._run_async_slotted(cmd)
+
+        locked = (
+            "is locked" in err
+            or "E155004" in err
+            or "run 'svn cleanup'" in err
+        )
+
+        if code != 0 and locked:
+            logger.warning("工作副本被锁定，执行 cleanup 后重试。")
+            await asyncio.to_thread(self.cleanup, False)
+            code, out, err = await self._run_async_slotted(cmd)
+
         if check and code != 0:
             raise VCSException(
                 f"svn 执行失败: {' '.join(cmd)}\n"
@@ -186,6 +578,126 @@ class SvnOps:
             )
 
         return code, out, err
+
+    def _svn_stream(self, args: List[str], check: bool = True) -> Iterator[str]:
+        """
+        执行 svn 命令并逐行 yield stdout（保留行尾换行），不缓冲整段输出。
+
+        调用方提前结束迭代（break / return）时会终止子进程，不再检查退出码；
+        完整读完后 check=True 且退出码非 0 时抛 VCSException。
+        不做锁定重试，适合 status 这类只读命令。
+        迭代期间占用一个 svn 进程名额，不要在迭代中再发起 svn 调用。
+        """
+        cmd = ["svn"] + args
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("执行 SVN 命令: %s", " ".join(cmd))
+        # stderr 写临时文件：stdout 读完前没人读 stderr，走管道可能把子进程堵死
+        errf = tempfile.TemporaryFile()
+        _SVN_PROC_SLOTS.acquire()
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                cwd=self.repo_path,
+                stdout=subprocess.PIPE,
+                stderr=errf,
+                text=True,
+                encoding="utf-8",
+                errors="ignore",
+                bufsize=1,
+            )
+        except BaseException:
+            _SVN_PROC_SLOTS.release()
+            errf.close()
+            raise
+
+        finished = False
+        try:
+            yield from proc.stdout
+            finished = True
+        finally:
+            if not finished and proc.poll() is None:
+                proc.terminate()
+            proc.stdout.close()
+            code = proc.wait()
+            _SVN_PROC_SLOTS.release()
+            err = _read_stderr(errf)
+
+        if check and code != 0:
+            raise VCSException(
+                f"svn 执行失败: {' '.join(cmd)}\n"
+                f"退出码: {code}\nERR:\n{err}"
+            )
+
+    # ------------------------------------------------------------------
+    # 流式解析 svn log --xml：逐条产出 <logentry>，用完即释放
+    # ------------------------------------------------------------------
+
+    def _log_target(self, *revs: str) -> Tuple[List[str], bool]:
+        """
+        svn log 的目标：返回 (追加到命令末尾的参数, in_wc)。
+
+        元数据查询直接对 URL 执行 svn log，不读 wc.db、不抢工作副本锁，
+        便于 collect_change_summary 并发扫描；
+        revision 中含 BASE / COMMITTED / PREV 等工作副本关键字时仍走工作副本。
+        """
+        for rev in revs:
+            if any(k in rev.upper() for k in _WC_REV_KEYWORDS):
+                return [], True
+        return [self._repo_url], False
+
+    def _iter_log_entries(
+        self,
+        args: List[str],
+        check: bool = False,
+        *,
+        in_wc: bool = True,
+    ):
+        """
+        执行 svn log --xml，把 stdout 管道直接交给 iterparse，
+        逐个 yield <logentry> 元素；调用方处理完后该元素会被清空，
+        峰值内存只取决于最大的单条 logentry，而不是整份 XML。
+
+        check=False 时输出为空 / 解析失败都按"无记录"处理。
+        迭代期间占用一个 svn 进程名额，不要在迭代中再发起 svn 调用。
+        """
+        cmd = ["svn"] + args
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("执行 SVN 命令: %s", " ".join(cmd))
+        with _SVN_PROC_SLOTS:
+            yield from self._iter_log_stream(cmd, check, in_wc)
+
+    def _iter_log_stream(self, cmd: List[str], check: bool, in_wc: bool):
+        proc, errf = run_cmd_stream(cmd, cwd=self.repo_path if in_wc else None)
+
+        parse_error = None
+        try:
+            for _, elem in ET.iterparse(proc.stdout, events=("end",)):
+                if elem.tag != "logentry":
+                    continue
+                yield elem
+                elem.clear()
+                # lxml：同时释放已处理的兄弟节点
+                if hasattr(elem, "getprevious"):
+                    while elem.getprevious() is not None:
+                        del elem.getparent()[0]
+        except ET.ParseError as e:
+            # svn 中途失败时 XML 被截断，先看退出码再决定报哪种错
+            parse_error = e
+        finally:
+            proc.stdout.close()
+            code = proc.wait()
+            err = _read_stderr(errf)
+
+        if check and code != 0:
+            raise VCSException(
+                f"svn 执行失败: {' '.join(cmd)}\n"
+                f"退出码: {code}\nERR:\n{err}"
+            )
+        if check and parse_error is not None:
+            raise VCSException(
+                f"svn 输出解析失败: {' '.join(cmd)}\n{parse_error}\nERR:\n{err}"
+            )
+
     # ------------------------------------------------------------------
     # 工作副本相关操作
     # ------------------------------------------------------------------
@@ -204,32 +716,69 @@ class SvnOps:
         """
         回退所有本地修改：
         1) svn revert -R .
-        2) 删除未版本控制的文件（svn status 显示 ?）
+        2) 删除未版本控制的文件（svn cleanup --remove-unversioned，
+           不支持时按 svn status 逐个删除）
         """
         logger.info("回退本地修改: %s", self.repo_path)
 
         # 回退版本控制下的所有修改
         self._svn(["revert", "-R", "."], check=False)
 
-        # 查找未版本控制文件
-        code, out, _ = self._svn(["status", "--no-ignore"], check=False)
+        # 优先交给 svn 原生批量删除；老版本 svn 不支持时走 Python 兜底
+        if self._cleanup_remove_unversioned():
+            return
+        self._remove_unversioned_files()
 
-        for line in out.splitlines():
-            if not line.strip():
-                continue
+    def _cleanup_remove_unversioned(self) -> bool:
+        """
+        svn cleanup --remove-unversioned（svn 1.9+）。
+        返回 False 表示当前 svn 不支持该参数，结果缓存在类上只探测一次。
+        """
+        if SvnOps._cleanup_remove_unversioned_supported is False:
+            return False
 
-            status = line[0]
-            path = line[8:].strip() if len(line) > 8 else ""
+        code, _, err = run_cmd(
+            ["svn", "cleanup", "--remove-unversioned", "."],
+            cwd=self.repo_path,
+        )
+        if code == 0:
+            SvnOps._cleanup_remove_unversioned_supported = True
+            return True
 
-            if status != "?":
+        if "invalid option" in err or "E205000" in err:
+            logger.info("svn 不支持 cleanup --remove-unversioned，改用逐个删除")
+            SvnOps._cleanup_remove_unversioned_supported = False
+        return False
+
+    def _remove_unversioned_files(self):
+        """
+        删除未版本控制的文件（svn status 显示 ?）。
+        """
+        # 查找未版本控制文件（--xml：结构化解析，不依赖列位置 / locale）
+        code, out, _ = self._svn(
+            ["status", "--no-ignore", "--xml"], check=False)
+        if code != 0 or not out.strip():
+            return
+
+        try:
+            root = ET.fromstring(out.encode("utf-8"))
+        except ET.ParseError:
+            logger.warning("svn status 输出解析失败: %s", self.repo_path)
+            return
+
+        for entry in root.iter("entry"):
+            wc_status = entry.find("wc-status")
+            if wc_status is None or wc_status.get("item") != "unversioned":
                 continue
+
+            path = entry.get("path", "")
             if not path:
                 continue
 
             full = os.path.join(self.repo_path, path)
             if os.path.isdir(full):
                 logger.debug("删除未版本控制目录: %s", full)
-                shutil.rmtree(full, ignore_errors=True)
+                _fast_rmtree(full)
             elif os.path.exists(full):
                 logger.debug("删除未版本控制文件: %s", full)
                 try:
@@ -281,41 +830,87 @@ class SvnOps:
     def get_externals(self) -> List[str]:
         """
         获得当前工作副本中定义的 external 本地路径列表。
-        不递归。
+        不递归：svn propget -R 只遍历本工作副本，不会进入 external 内部。
         """
+        # svn:externals 存在 wc.db 里；wc.db 未变化则直接用上次的解析结果
+        admin_dir = os.path.join(self.repo_path, ".svn")
+        cache_path = os.path.join(admin_dir, EXTERNALS_CACHE_NAME)
+        try:
+            wc_mtime = os.stat(os.path.join(admin_dir, "wc.db")).st_mtime_ns
+        except OSError:
+            wc_mtime = None
+
+        if wc_mtime is not None:
+            cached = _read_json_file(cache_path)
+            if cached and cached.get("mtime") == wc_mtime:
+                # 与未命中缓存时同样 normpath，缓存冷热返回的路径字符串一致
+                return [
+                    os.path.normpath(os.path.join(self.repo_path, rel))
+                    for rel in cached.get("externals", [])
+                ]
+
         code, out, _ = self._svn(
-            ["propget", "svn:externals", "-R"],
+            ["propget", "svn:externals", "-R", "--xml"],
             check=False
         )
+        if code != 0:
+            return []
+
+        try:
+            targets = (
+                ET.fromstring(out.encode("utf-8")).iter("target")
+                if out.strip() else []
+            )
+        except ET.ParseError:
+            logger.warning("svn:externals 解析失败: %s", self.repo_path)
+            return []
 
         exts = []
-        for line in out.splitlines():
-            if " - " in line:
-                local = line.split(" - ", 1)[0].strip()
-                exts.append(os.path.join(self.repo_path, local))
+        for target in targets:
+            # target path 是定义该属性的目录；external 路径相对于它
+            base = os.path.join(self.repo_path, target.get("path", "."))
+            for prop in target.iter("property"):
+                for line in (prop.text or "").splitlines():
+                    local = _external_local_path(line)
+                    if local:
+                        exts.append(os.path.normpath(
+                            os.path.join(base, local)))
+
+        if wc_mtime is not None:
+            rels = [os.path.relpath(e, self.repo_path) for e in exts]
+            _write_json_file(cache_path, {"mtime": wc_mtime, "externals": rels})
         return exts
 
     def get_all_externals(self) -> List[str]:
         """
-        获得所有 external（递归）。
+        获得所有 external（含嵌套，逐层展开）。
+        结果缓存在实例上，update_to / switch_to 后失效。
         """
-        visited = set()
-        result = []
+        if self._all_externals_cache is not None:
+            return list(self._all_externals_cache)
 
-        def scan(path: str):
-            if path in visited:
-                return
-            visited.add(path)
-
-            ops = SvnOps(path)
-            ex = ops.get_externals()
-            for e in ex:
-                if os.path.isdir(e):
-                    result.append(e)
-                    scan(e)
-
-        scan(self.repo_path)
-        return result
+        # 按层 BFS：同一层的 get_externals 并发执行（每个都是一次 svn propget），
+        # 结果按提交顺序收集，输出顺序稳定
+        visited = {self.repo_path}
+        result = []
+        queue = deque([self.repo_path])
+
+        with ThreadPoolExecutor(max_workers=MAX_SCAN_WORKERS) as pool:
+            while queue:
+                level = list(queue)
+                queue.clear()
+                for ex in pool.map(
+                    lambda path: SvnOps(path).get_externals(), level
+                ):
+                    for e in ex:
+                        if e in visited or not os.path.isdir(e):
+                            continue
+                        visited.add(e)
+                        result.append(e)
+                        queue.append(e)
+
+        self._all_externals_cache = result
+        return list(result)
 
     def clean_externals(self):
         """
@@ -336,73 +931,94 @@ class SvnOps:
         """
         Workspace 级别多仓库 checkout + 可选 sparse。
         所有 project 都是独立 SVN 仓库，不使用 external。
+
+        各 project 是互不相关的工作副本，并发 checkout / 展开；
+        单个 project 内部的 sparse 展开仍按父 → 子串行。
+        paths 规则会先经 normalize_sparse_profile 规范化。
         """
 
         projects = sparse_profile.get("projects")
         if not isinstance(projects, dict):
             raise VCSException("profile 缺少 projects 或格式错误")
+        # 调用方可能直接传入未规范化的 JSON（缺 depth、"/Assets" 写法）
+        projects = normalize_sparse_profile(sparse_profile)["projects"]
 
         for name, proj in projects.items():
-            repo_url = proj.get("repo_url")
-            root_path = proj.get("root_path")
-            root_depth = proj.get("root_depth", "infinity")
-            paths = proj.get("paths", [])
-
-            if not repo_url or not root_path:
+            if not proj.get("repo_url") or not proj.get("root_path"):
                 raise VCSException(f"project {name} 缺少 repo_url 或 root_path")
 
-            project_path = os.path.join(self.repo_path, root_path)
-            ops = SvnOps(project_path)
+        if not projects:
+            return
 
-            logger.info(
-                "[svn][%s] checkout %s -> %s (depth=%s)",
-                name, repo_url, project_path, root_depth
-            )
+        errors = []
+        workers = min(MAX_CHECKOUT_WORKERS, len(projects))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(self._checkout_project, name, proj): name
+                for name, proj in projects.items()
+            }
+            for fut in as_completed(futures):
+                name = futures[fut]
+                try:
+                    fut.result()
+                except Exception as e:
+                    logger.error("[svn][%s] checkout 失败: %s", name, e)
+                    errors.append(f"{name}: {e}")
 
-            # --------------------------------------------------
-            # 1. checkout 仓库根
-            # --------------------------------------------------
-            if not ops.is_working_copy():
-                os.makedirs(project_path, exist_ok=True)
-                ops._svn(
-                    ["checkout", repo_url, project_path, "--depth", root_depth],
-                    check=True
-                )
-            else:
-                logger.info("[svn][%s] reuse existing working copy", name)
+        if errors:
+            raise VCSException(
+                "sparse workspace 失败:\n" + "\n".join(errors))
 
-            # --------------------------------------------------
-            # 2. sparse 展开（仅对本仓库）
-            # --------------------------------------------------
-            if not paths:
-                continue
+    def _checkout_project(self, name: str, proj: dict):
+        """
+        checkout 单个 project 根目录，并按 paths 做 sparse 展开。
+        """
+        repo_url = proj.get("repo_url")
+        root_path = proj.get("root_path")
+        root_depth = proj.get("root_depth", "infinity")
+        paths = proj.get("paths", [])
 
-            # 显式规则兜底：按路径深度排序（父 → 子）
-            def _depth(p: str) -> int:
-                return p.strip("/").count("/")
+        project_path = os.path.join(self.repo_path, root_path)
+        ops = SvnOps(project_path)
+
+        logger.info(
+            "[svn][%s] checkout %s -> %s (depth=%s)",
+            name, repo_url, project_path, root_depth
+        )
 
-            sorted_paths = sorted(
-                paths,
-                key=lambda x: _depth(x["path"])
+        # --------------------------------------------------
+        # 1. checkout 仓库根
+        # --------------------------------------------------
+        if not ops.is_working_copy():
+            os.makedirs(project_path, exist_ok=True)
+            ops._svn(
+                ["checkout", repo_url, project_path, "--depth", root_depth],
+                check=True
             )
+        else:
+            logger.info("[svn][%s] reuse existing working copy", name)
 
-            for item in sorted_paths:
-                rel = item["path"].strip("/")
-                depth = item.get("depth", "infinity")
+        # --------------------------------------------------
+        # 2. sparse 展开（仅对本仓库）
+        # --------------------------------------------------
+        if not paths:
+            return
 
-                logger.info(
-                    "[svn][%s] expand %s (depth=%s)",
-                    name, rel, depth
-                )
+        # 同 depth 的路径合并为一次 svn update（多 target），减少进程与网络往返
+        for depth, rels in sparse_update_batches(paths):
+            logger.info(
+                "[svn][%s] expand %s (depth=%s)",
+                name, " ".join(rels), depth
+            )
 
-                # ❗关键点：
-                # - 使用相对路径
-                # - 不 mkdir
-                # - 不检查 os.path.exists
-                ops._svn(
-                    ["update", rel, "--depth", depth],
-                    check=True
-                )
+            # ❗关键点：
+            # - 使用相对路径
+            # - 不 mkdir
+            # - 不检查 os.path.exists
+            ops._svn(
+                ["update", *rels, "--depth", depth],
+                check=True
+            )
 
     # ------------------------------------------------------------------
     # 基础 checkout
@@ -433,10 +1049,20 @@ class SvnOps:
     def get_current_url(self) -> str:
         """
         获取当前工作副本对应的远端 URL。
+        结果缓存在实例上，switch_to 后失效。
         """
+        if self._url_cache is not None:
+            return self._url_cache
+
         code, out, _ = self._svn(["info", "--show-item", "url"],
                                  check=True)
-        return out.strip()
+        self._url_cache = out.strip()
+        return self._url_cache
+
+    @property
+    def _repo_url(self) -> str:
+        """svn log 使用的远端 URL（首次访问时经 get_current_url 获取并缓存）。"""
+        return self.get_current_url()
 
     def get_current_revision(self) -> str:
         """
@@ -453,19 +1079,65 @@ class SvnOps:
         获取某个 revision 的提交时间。
         用于时间区间查询 external 日志。
         """
+        cached = self._rev_time_cache.get(revision)
+        if cached is not None:
+            return cached
+
+        target, in_wc = self._log_target(revision)
         code, out, _ = self._svn(
-            ["log", "--xml", "-r", revision],
-            check=True
+            ["log", "--xml", "-r", revision] + target,
+            check=True,
+            in_wc=in_wc,
         )
 
-        root = ET.fromstring(out)
+        root = ET.fromstring(out.encode("utf-8"))
         entry = root.find("logentry")
         if entry is None:
             raise VCSException(f"无法获取 revision {revision} 的日期")
 
         date_text = entry.findtext("date", "").strip()
+        if revision.isdigit():  # HEAD 等关键字会变化，不缓存
+            self._rev_time_cache[revision] = date_text
         return date_text
 
+    def get_rev_times(self, revisions: List[str]) -> Dict[str, str]:
+        """
+        批量获取多个 revision 的提交时间，返回 {revision: date}。
+        未缓存的数字 revision 合并为一次 svn log -r R1 -r R2 ...；
+        HEAD 等关键字无法与结果对应，仍逐个查询。
+        """
+        result: Dict[str, str] = {}
+        missing = []
+        for rev in revisions:
+            if rev in self._rev_time_cache:
+                result[rev] = self._rev_time_cache[rev]
+            elif rev.isdigit():
+                if rev not in missing:
+                    missing.append(rev)
+            else:
+                result[rev] = self.get_rev_time(rev)
+
+        if missing:
+            args = ["log", "--xml"]
+            for rev in missing:
+                args += ["-r", rev]
+            target, in_wc = self._log_target(*missing)
+            code, out, _ = self._svn(args + target, check=True, in_wc=in_wc)
+
+            root = ET.fromstring(out.encode("utf-8"))
+            for entry in root.findall("logentry"):
+                rev = entry.get("revision", "").strip()
+                date_text = entry.findtext("date", "").strip()
+                self._rev_time_cache[rev] = date_text
+                if rev in missing:
+                    result[rev] = date_text
+
+            for rev in missing:
+                if rev not in result:
+                    raise VCSException(f"无法获取 revision {rev} 的日期")
+
+        return result
+
     # ------------------------------------------------------------------
     # update 到指定版本
     # ------------------------------------------------------------------
@@ -485,6 +1157,7 @@ class SvnOps:
         else:
             self._svn(["update", "-r", target], check=True)
 
+        self._all_externals_cache = None
         self.after_update_rev = self.get_current_revision()
 
     # ------------------------------------------------------------------
@@ -507,8 +1180,50 @@ class SvnOps:
         if revision:
             cmd += ["-r", revision]
 
+        self._url_cache = None
+        self._all_externals_cache = None
         self._svn(cmd, check=True)
 
+    # ------------------------------------------------------------------
+    # 工作副本是否已是最新（用于跳过无意义的 svn update）
+    # ------------------------------------------------------------------
+
+    def wc_min_rev(self) -> Optional[int]:
+        """
+        整棵工作副本中最旧的 revision（svnversion，本地查询，不含 external）。
+        混合版本（如 "4123:4168"）取较小值；含 switched 子路径或无法解析时返回 None。
+        """
+        with _SVN_PROC_SLOTS:
+            code, out, err = run_cmd(["svnversion", "."], cwd=self.repo_path)
+        if code != 0:
+            raise VCSException(f"svnversion 执行失败: {self.repo_path}\n{err}")
+
+        m = _SVNVERSION_RE.match(out.strip())
+        if not m or "S" in m.group(3):
+            return None
+        return int(m.group(1))
+
+    def server_head_rev(self) -> int:
+        """
+        当前 URL 在服务端 HEAD 上的最后修改 revision（last-changed-revision）。
+        与仓库全局 HEAD 不同：仓库其他路径的提交不会让它变化。
+        """
+        code, out, _ = self._svn(
+            ["info", "-r", "HEAD", "--show-item", "last-changed-revision",
+             self._repo_url],
+            check=True,
+            in_wc=False,
+        )
+        return int(out.strip())
+
+    def is_at_head(self) -> bool:
+        """
+        整棵工作副本（不只是根目录）都已包含服务端该 URL 的最新修改时返回 True；
+        混合版本中只要有子路径落后（如 update_paths_to_revision 之后）就返回 False。
+        """
+        lo = self.wc_min_rev()
+        return lo is not None and lo >= self.server_head_rev()
+
     # ------------------------------------------------------------------
     # 获取远端 HEAD revision（用于 external 回溯）
     # ------------------------------------------------------------------
@@ -579,48 +1294,81 @@ class SvnOps:
     def get_revision_list(
         self,
         from_rev: Optional[str],
-        to_rev: str
+        to_rev: str,
+        page_size: int = LOG_PAGE_SIZE,
     ) -> List[RevisionChange]:
         """
         获取 revision 区间的提交记录（不含 diff）。
         返回 RevisionChange 列表。
         """
-        rev_range = f"{from_rev}:{to_rev}" if from_rev else to_rev
+        return list(self.iter_revision_list(from_rev, to_rev, page_size))
 
+    def iter_revision_list(
+        self,
+        from_rev: Optional[str],
+        to_rev: str,
+        page_size: int = LOG_PAGE_SIZE,
+    ) -> Iterator[RevisionChange]:
+        """
+        get_revision_list 的生成器版本：
+        按 page_size 分页执行 svn log --limit，逐条产出 RevisionChange，
+        宽区间不会一次拉回整份巨型 XML。
+        """
+        if not from_rev:
+            yield from self._iter_revision_page(to_rev, None)
+            return
+
+        # 起止可能是 HEAD / BASE / {日期}，只看字面值判断不了方向（如 HEAD:N 是降序），
+        # 也无法判断何时到达终点；需要翻页时先把终点解析成数字
+        step = None
+        cursor = from_rev
+        while True:
+            count = 0
+            last = None
+            for change in self._iter_revision_page(
+                f"{cursor}:{to_rev}", page_size
+            ):
+                count += 1
+                last = change.revision
+                yield change
+
+            if count < page_size or not last or not last.isdigit():
+                return
+            if not to_rev.isdigit():
+                to_rev = str(self._resolve_log_rev(to_rev))
+            if last == to_rev:
+                return
+            if step is None:
+                step = 1 if int(to_rev) > int(last) else -1
+            cursor = str(int(last) + step)
+
+    def _resolve_log_rev(self, rev: str) -> int:
+        """
+        把 HEAD / BASE / {日期} 等解析为 svn log 在同一目标上能看到的 revision
+        （目标的 last-changed-revision）。
+        """
+        target, in_wc = self._log_target(rev)
         code, out, _ = self._svn(
-            ["log", "-v", "--xml", "-r", rev_range],
-            check=True
+            ["info", "-r", rev, "--show-item", "last-changed-revision"] + target,
+            check=True,
+            in_wc=in_wc,
         )
+        return int(out.strip())
 
-        root = ET.fromstring(out)
-        changes: List[RevisionChange] = []
-
-        for entry in root.findall("logentry"):
-            rid = entry.get("revision", "").strip()
-            author = entry.findtext("author", "").strip()
-            date = entry.findtext("date", "").strip()
-            msg = entry.findtext("msg", "").strip()
-
-            files = []
-            paths = entry.find("paths")
-            if paths is not None:
-                for p in paths.findall("path"):
-                    act = p.attrib.get("action", "?")
-                    text = (p.text or "").strip()
-                    if text:
-                        files.append(FileChange(path=text, action=act))
-
-            changes.append(
-                RevisionChange(
-                    revision=rid,
-                    author=author,
-                    date=date,
-                    message=msg,
-                    files=files,
-                )
-            )
-
-        return changes
+    def _iter_revision_page(
+        self,
+        rev_range: str,
+        limit: Optional[int],
+    ) -> Iterator[RevisionChange]:
+        args = ["log", "-v", "--xml", "-r", rev_range]
+        if limit:
+            args += ["--limit", str(limit)]
+
+        target, in_wc = self._log_target(rev_range)
+        for entry in self._iter_log_entries(
+            args + target, check=True, in_wc=in_wc
+        ):
+            yield _parse_logentry(entry)
 
     # ------------------------------------------------------------------
     # 给单个文件生成 diff
@@ -640,16 +1388,25 @@ class SvnOps:
             args.append(file_path)
 
         code, out, _ = self._svn(args, check=True)
+        return _truncate_lines(out, max_lines)
 
-        lines = out.splitlines()
-        if len(lines) > max_lines:
-            part = lines[:max_lines]
-            part.append(
-                f"...(剩余 {len(lines) - max_lines} 行已截断)"
-            )
-            return "\n".join(part)
+    def get_diff_by_revision(
+        self,
+        revision: str,
+        max_lines: int = 200
+    ) -> Dict[str, str]:
+        """
+        一次 svn diff -c 拿到某 revision 的全部 diff，
+        按 "Index: " 文件边界拆分，返回 {工作副本相对路径: diff}。
+        每个文件的 diff 单独按 max_lines 截断。
+        """
+        code, out, _ = self._svn(["diff", "-c", revision], check=True)
 
-        return out
+        diffs: Dict[str, str] = {}
+        for block in _DIFF_INDEX_RE.split(out)[1:]:
+            path = block.partition("\n")[0].strip()
+            diffs[path] = _truncate_lines("Index: " + block, max_lines)
+        return diffs
 
     # ------------------------------------------------------------------
     # 按时间区间获取 external 的变更（统一以主库的时间为准）
@@ -676,40 +1433,15 @@ class SvnOps:
         else:
             rev_range = f"{{{t_end}}}"
 
-        code, out, _ = self._svn(
-            ["log", "-v", "--xml", "-r", rev_range],
-            check=False
-        )
-
-        root = ET.fromstring(out or "<log/>")
-        changes: List[RevisionChange] = []
-
-        for entry in root.findall("logentry"):
-            rid = entry.get("revision", "").strip()
-            author = entry.findtext("author", "").strip()
-            date = entry.findtext("date", "").strip()
-            msg = entry.findtext("msg", "").strip()
-
-            files = []
-            paths = entry.find("paths")
-            if paths is not None:
-                for p in paths.findall("path"):
-                    act = p.attrib.get("action", "?")
-                    text = (p.text or "").strip()
-                    if text:
-                        files.append(FileChange(path=text, action=act))
-
-            changes.append(
-                RevisionChange(
-                    revision=rid,
-                    author=author,
-                    date=date,
-                    message=msg,
-                    files=files,
-                )
+        target, in_wc = self._log_target(rev_range)
+        return [
+            _parse_logentry(entry)
+            for entry in self._iter_log_entries(
+                ["log", "-v", "--xml", "-r", rev_range] + target,
+                check=False,
+                in_wc=in_wc,
             )
-
-        return changes
+        ]
 
     # ------------------------------------------------------------------
     # 主函数：按时间区间收集变更（主库 + external）
@@ -768,19 +1500,15 @@ class SvnOps:
 
         # 生成 diff
         if include_diff:
-            for rev in summary["main"]:
-                for f in rev.files:
-                    f.diff = self.get_diff(
-                        rev.revision,
-                        f.path,
-                        max_lines=max_diff_lines
-                    )
+            self._fill_diffs(summary["main"], max_diff_lines)
 
         # ------------------------------
         # external 变更
         # ------------------------------
+        # 每个 external 是独立的工作副本（各自的 SvnOps / repo_path），
+        # 无共享可变状态，可并发扫描；结果按 external 原顺序写回
         if include_externals:
-            for e in self.get_all_externals():
+            def scan_external(e: str):
                 ext_ops = SvnOps(e)
                 ext_url = ext_ops.get_current_url()
 
@@ -790,18 +1518,49 @@ class SvnOps:
 
                 # 填入 diff
                 if include_diff:
-                    for rev in ex_list:
-                        for f in rev.files:
-                            f.diff = ext_ops.get_diff(
-                                rev.revision,
-                                f.path,
-                                max_lines=max_diff_lines,
-                            )
+                    ext_ops._fill_diffs(ex_list, max_diff_lines)
+
+                return ext_url, ex_list
 
-                summary["ext"][ext_url] = ex_list
+            exts = self.get_all_externals()
+            if exts:
+                workers = min(MAX_SCAN_WORKERS, len(exts))
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    futures = [pool.submit(scan_external, e) for e in exts]
+                    for fut in futures:
+                        ext_url, ex_list = fut.result()
+                        summary["ext"][ext_url] = ex_list
 
         return summary
 
+    def _fill_diffs(
+        self,
+        changes: List[RevisionChange],
+        max_diff_lines: int,
+    ):
+        """
+        每个 revision 只跑一次 svn diff（多个 revision 并发），
+        再按文件拆分写回 FileChange.diff。
+        """
+        revs = [rev for rev in changes if rev.files]
+        if not revs:
+            return
+
+        workers = min(MAX_DIFF_WORKERS, len(revs))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    self.get_diff_by_revision,
+                    rev.revision,
+                    max_lines=max_diff_lines,
+                )
+                for rev in revs
+            ]
+            for rev, fut in zip(revs, futures):
+                diffs = fut.result()
+                for f in rev.files:
+                    f.diff = _lookup_diff(diffs, f.path)
+
     # ------------------------------------------------------------------
     # 基于 update_to() 前后的版本号，生成 UpdateResult
     # ------------------------------------------------------------------
@@ -824,8 +1583,10 @@ class SvnOps:
         if not self.before_update_rev or not self.after_update_rev:
             raise VCSException("update_to() 未执行，无法生成更新结果")
 
-        t_start = self.get_rev_time(self.before_update_rev)
-        t_end = self.get_rev_time(self.after_update_rev)
+        times = self.get_rev_times(
+            [self.before_update_rev, self.after_update_rev])
+        t_start = times[self.before_update_rev]
+        t_end = times[self.after_update_rev]
 
         summary = self.collect_change_summary(
             start_time=t_start,
@@ -835,16 +1596,6 @@ class SvnOps:
             include_externals=include_externals
         )
 
-        all_changes: List[RevisionChange] = []
-
-        # 主库变更
-        for rev in summary["main"]:
-            all_changes.append(rev)
-
-        # external 变更
-        for _, lst in summary["ext"].items():
-            all_changes.extend(lst)
-
         # 按 revision 排序（非完美，但可用）
         def _key(c: RevisionChange):
             try:
@@ -852,10 +1603,41 @@ class SvnOps:
             except ValueError:
                 return 0
 
-        all_changes.sort(key=_key)
+        # 主库 + external 变更：svn log 返回的每个列表本身已按 revision 升序，
+        # 这里只在个别列表无序时单独排一次，再做 k 路归并，避免整体重排
+        lists: List[List[RevisionChange]] = []
+        for lst in [summary["main"], *summary["ext"].values()]:
+            keys = [_key(c) for c in lst]
+            if any(a > b for a, b in zip(keys, keys[1:])):
+                lst = [c for _, _, c in sorted(zip(keys, range(len(lst)), lst))]
+            lists.append(lst)
+
+        all_changes: List[RevisionChange] = list(heapq.merge(*lists, key=_key))
 
         return UpdateResult(
             from_rev=self.before_update_rev,
             to_rev=self.after_update_rev,
             revision_changes=all_changes
         )
+
+
+# ----------------------------------------------------------------------
+# 按路径复用 SvnOps 实例
+# ----------------------------------------------------------------------
+
+_OPS_CACHE: Dict[str, SvnOps] = {}
+_OPS_CACHE_LOCK = threading.Lock()
+
+
+def ops_for(path: str) -> SvnOps:
+    """
+    返回 path 对应的 SvnOps（进程内按绝对路径复用，线程安全）。
+    同一工作副本的多个步骤共享实例上的 URL / revision 时间 / externals 缓存。
+    """
+    key = os.path.abspath(path)
+    with _OPS_CACHE_LOCK:
+        ops = _OPS_CACHE.get(key)
+        if ops is None:
+            ops = SvnOps(path)
+            _OPS_CACHE[key] = ops
+        return ops
@@ -13,9 +13,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 参数名 -> 环境变量：命令行未指定时用环境变量作默认值
+# （CI 矩阵里按 target 反复调用时，公共参数可统一放在环境里）
+ENV_DEFAULTS = {
+    "git_dir": "BF_GIT_DIR",
+    "ssh_key": "BF_SSH_KEY",
+    "build_note": "BUILD_NOTE",
+}
+
+
+def _arg_defaults(ctx) -> dict:
+    env = os.environ
+    defaults = {k: env.get(v, "") for k, v in ENV_DEFAULTS.items()}
+    if not defaults["git_dir"]:
+        defaults["git_dir"] = os.path.join(ctx.workspace or ".", "_git")
+    return defaults
+
 
 def main():
     ctx = init_from_env()
+    defaults = _arg_defaults(ctx)
 
     parser = argparse.ArgumentParser(
         prog="csharp_publish_cli", description="Git -> SVN -> Build -> Commit")
@@ -23,7 +40,7 @@ def main():
     parser.add_argument("--git-branch", required=True)
 
     parser.add_argument(
-        "--git-dir", default=os.path.join(ctx.workspace or ".", "_git"))
+        "--git-dir", default=defaults["git_dir"])
 
     parser.add_argument("--sln", required=True,
                         help="sln path (relative to svn_workspace or absolute)")
@@ -31,12 +48,13 @@ def main():
                         help="use Release configuration (default Debug)")
 
     # 你不想要 trigger-type，那就用 build-note（兼容 COMMENT）
-    parser.add_argument("--build-note", default="",
+    parser.add_argument("--build-note", default=defaults["build_note"],
                         help="build note / reason (prefer BUILD_NOTE env)")
 
     parser.add_argument("--force", action="store_true",
                         help="force build even if git no changes")
-    parser.add_argument("--ssh-key", default="", help="optional ssh key path")
+    parser.add_argument("--ssh-key", default=defaults["ssh_key"],
+                        help="optional ssh key path")
 
     args = parser.parse_args()
 
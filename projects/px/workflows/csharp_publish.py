@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 import os
-import json
+import asyncio
+import re
 import shutil
+import time
 import logging
-from typing import Dict, List, Optional
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from pathlib import Path
 
+from core import json_util
 from core.build_context import (
     init_from_env,
     set_build_context,
@@ -14,120 +19,395 @@ from core.build_context import (
     build_success_summary,
 )
 
-from modules.vcs.git_ops import sync_repo_with_info
-from modules.vcs.svn_ops import SvnOps  # 你已有的大版本 svn_ops
+from modules.vcs.git_ops import GitCommandError, run_git, sync_repo_with_info
+from modules.vcs.svn_ops import (  # 你已有的大版本 svn_ops
+    VCSException,
+    load_sparse_profile,
+    ops_for,
+    sparse_update_batches,
+)
 from modules.notify.ic_util import send_to_group, send_to_user
 from modules.build.csharp_builder import build_csharp  # 按你现有文件名调整 import
 
 logger = logging.getLogger(__name__)
 
+# px 项目根目录与 SVN sparse profile（导入时解析一次，路径稳定）
+_PX_ROOT = Path(__file__).resolve().parents[1]
+_SVN_PROFILE_JSON = str(_PX_ROOT / "configs" / "svn_sparse_profile.json")
+
+# sparse_commit 跨 project 并发的线程上限
+MAX_PROJECT_WORKERS = 8
+
+# svn add / delete 单次调用的最大 target 数
+SVN_TARGETS_PER_CALL = 500
+
+# svn add / delete 单次调用的 target 总长度上限（字符），
+# Windows 命令行上限约 32K，留出 svn 路径 / 参数 / 引号的余量
+SVN_TARGETS_MAX_CHARS = 24000
+
+# 这些文件变化时才需要 NuGet restore（后缀 / 文件名，小写比较）
+_RESTORE_INPUT_SUFFIXES = (".csproj", ".props", ".targets")
+_RESTORE_INPUT_NAMES = frozenset((
+    "packages.lock.json",
+    "packages.config",
+    "nuget.config",
+    "global.json",
+))
+
+# svn status 首列中表示"有变化"的标记
+# 常见：? 未加入 / M 修改 / A 新增 / D 删除 / ! 丢失
+_CHANGE_FLAGS = frozenset("?MADRC!~")
+
+# svn status 行：首列状态标记 + 空白 + 路径
+_STATUS_RE = re.compile(r"([?MADRCI!~])[ \t]+(.+?)\s*$")
+
+# svn_auto_add_remove：status 标记 -> svn 子命令
+_FLAG_ACTIONS = {"?": "add", "!": "delete"}
+
 
 class WorkflowError(Exception):
     pass
 
 
-def _load_json(path: str) -> Dict:
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def _safe_mkdir(path: str):
+    # 目录通常已存在：先 stat，省掉一次 mkdir 往返（网络盘上更明显）
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
 
 
-def _safe_mkdir(path: str):
-    os.makedirs(path, exist_ok=True)
+def _iter_svn_status(repo_path: str) -> Iterator[Tuple[str, str]]:
+    """
+    流式执行 svn status，逐行产出 (flag, path)。
+    只保留首列为状态标记的行（空行、external 提示等直接跳过）。
+    """
+    ops = ops_for(repo_path)
+    try:
+        for line in ops._svn_stream(["status"]):
+            m = _STATUS_RE.match(line)
+            if m:
+                yield m.group(1), m.group(2)
+    except VCSException as e:
+        # status 失败也算异常
+        raise WorkflowError(f"svn status failed: {repo_path}") from e
+
+
+def _svn_status_lines(repo_path: str) -> List[Tuple[str, str]]:
+    """
+    执行一次 svn status，解析为 [(flag, path)]。
+    """
+    return list(_iter_svn_status(repo_path))
+
+
+def _has_changes(lines: Iterable[Tuple[str, str]]) -> bool:
+    return any(flag in _CHANGE_FLAGS for flag, _ in lines)
 
 
 def svn_has_changes(repo_path: str) -> bool:
-    ops = SvnOps(repo_path)
-    code, out, _ = ops._svn(["status"], check=False)
-    if code != 0:
-        # status 失败也算异常
-        raise WorkflowError(f"svn status failed: {repo_path}")
-    for line in (out or "").splitlines():
-        if not line.strip():
-            continue
-        # 常见：? 未加入 / M 修改 / A 新增 / D 删除 / ! 丢失
-        if line[0] in ("?", "M", "A", "D", "R", "C", "!", "~"):
-            return True
-    return False
+    # 流式判断：遇到第一处变化即停止（并终止 svn status 子进程）
+    it = _iter_svn_status(repo_path)
+    try:
+        return _has_changes(it)
+    finally:
+        it.close()
+
+
+def _target_batches(paths: List[str]) -> Iterator[List[str]]:
+    """
+    按数量（SVN_TARGETS_PER_CALL）和总长度（SVN_TARGETS_MAX_CHARS）切分 target
+    """
+    batch: List[str] = []
+    size = 0
+    for p in paths:
+        n = len(p) + 3  # 空格 + 可能的引号
+        if batch and (len(batch) >= SVN_TARGETS_PER_CALL or size + n > SVN_TARGETS_MAX_CHARS):
+            yield batch
+            batch, size = [], 0
+        batch.append(p)
+        size += n
+    if batch:
+        yield batch
+
+
+def svn_auto_add_remove(
+    repo_path: str,
+    lines: Optional[List[Tuple[str, str]]] = None,
+):
+    """
+    ? -> svn add，! -> svn delete。
+    lines 为已有的 _svn_status_lines 结果时不再重复执行 svn status。
+    """
+    if lines is None:
+        lines = _svn_status_lines(repo_path)
+
+    targets: Dict[str, List[str]] = {a: [] for a in _FLAG_ACTIONS.values()}
+    for flag, path in lines:
+        action = _FLAG_ACTIONS.get(flag)
+        if action and path:
+            # 路径含 @ 时 svn 会当成 peg revision，末尾补一个 @ 转义
+            targets[action].append(path + "@" if "@" in path else path)
+
+    # 多 target 一次调用；按数量和长度切分，避免命令行超长（Windows 约 32K 字符）。
+    # 整批失败时退回逐个执行，单个坏 target 只记录日志，不拖垮整批
+    ops = ops_for(repo_path)
+    for action, paths in targets.items():
+        for batch in _target_batches(paths):
+            try:
+                ops._svn([action, "--force", *batch], check=True, capture=False)
+            except VCSException as e:
+                logger.warning("svn %s 批量执行失败，改为逐个执行: %s", action, e)
+                for path in batch:
+                    code, _, err = ops._svn(
+                        [action, "--force", path], check=False, capture=False)
+                    if code != 0:
+                        logger.warning("svn %s 失败: %s\n%s", action, path, err)
+
+
+def _run_per_project(workspace: str, profile: Dict, fn, *args) -> List:
+    """
+    对 profile 中每个 project 并发执行 fn(project_path, proj, *args)。
+    每个 root_path 都是独立的工作副本（各自的 .svn 管理区），跨 project 并发安全；
+    单个 project 内部的 svn 操作仍串行。
+    返回 [(root_path, fn 返回值)]，顺序与 profile 一致；任一失败则汇总抛出。
+    """
+    projects = profile.get("projects") or {}
+    targets = [
+        (name, proj) for name, proj in projects.items()
+        if proj.get("root_path")
+    ]
+    if not targets:
+        return []
+
+    errors = []
+    results = []
+    workers = min(MAX_PROJECT_WORKERS, len(targets))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            (name, proj["root_path"], pool.submit(
+                fn, os.path.join(workspace, proj["root_path"]), proj, *args))
+            for name, proj in targets
+        ]
+        for name, root_path, fut in futures:
+            try:
+                results.append((root_path, fut.result()))
+            except Exception as e:
+                logger.error("[svn][%s] 失败: %s", name, e)
+                errors.append(f"{name}: {e}")
+
+    if errors:
+        raise WorkflowError("\n".join(errors))
+    return results
+
+
+async def _update_one_project(project_path: str, proj: Dict):
+    # 同一工作副本内必须串行：先 update 根，再按规则由父到子展开
+    pop = ops_for(project_path)
+
+    # 已在 HEAD（服务端该 URL 无新提交）则整个 project 跳过；
+    # profile 中的 sparse 规则已由 ensure_sparse_workspace 展开
+    try:
+        at_head = await asyncio.to_thread(pop.is_at_head)
+    except (VCSException, ValueError, OSError) as e:
+        logger.warning("[svn] HEAD 检查失败，照常 update: %s: %s",
+                       project_path, e)
+        at_head = False
+    if at_head:
+        logger.info("[svn] 已是最新，跳过 update: %s", project_path)
+        return
 
+    # 先 update 根
+    await pop._svn_async(["update"], check=True)
 
-def svn_auto_add_remove(repo_path: str):
-    ops = SvnOps(repo_path)
-    code, out, _ = ops._svn(["status"], check=False)
-    if code != 0:
-        raise WorkflowError(f"svn status failed: {repo_path}")
+    # 再按规则展开
+    paths = proj.get("paths") or []
 
-    for line in (out or "").splitlines():
-        if not line.strip():
-            continue
-        flag = line[0]
-        path = line[1:].strip()
-        if not path:
-            continue
+    # 同 depth 的路径合并成一次 svn update（多 target），父目录先于子目录展开
+    for depth, rels in sparse_update_batches(paths):
+        await pop._svn_async(["update", "--depth", depth, *rels], check=True)
 
-        if flag == "?":
-            ops._svn(["add", "--force", path], check=False)
-        elif flag == "!":
-            ops._svn(["delete", "--force", path], check=False)
+
+async def _sparse_update_async(workspace: str, profile: Dict):
+    """
+    各 project 的 svn 调用交给事件循环并发调度（每个子进程不占线程），
+    同时运行的 svn 客户端数由 svn_ops 的全局上限（MAX_SVN_PROCS）控制，
+    与线程侧的 svn 调用共用，避免压垮 SVN 服务端。
+    """
+    projects = profile.get("projects") or {}
+    targets = [
+        (name, proj) for name, proj in projects.items()
+        if proj.get("root_path")
+    ]
+
+    results = await asyncio.gather(
+        *(
+            _update_one_project(os.path.join(workspace, proj["root_path"]), proj)
+            for _, proj in targets
+        ),
+        return_exceptions=True,
+    )
+
+    errors = []
+    for (name, _), res in zip(targets, results):
+        if isinstance(res, Exception):
+            logger.error("[svn][%s] 失败: %s", name, res)
+            errors.append(f"{name}: {res}")
+    if errors:
+        raise WorkflowError("\n".join(errors))
 
 
 def sparse_update(workspace: str, profile: Dict):
     """
     你说的加强版 sparse_update：
     - 仓库不存在：sparse checkout（你已有 ensure_sparse_workspace 会做）
-    - 仓库存在：update + 按 paths 做 depth 展开
+    - 仓库存在：update + 按 paths 做 depth 展开（各 project 并发）
     """
-    ops = SvnOps(workspace)
+    ops = ops_for(workspace)
     ops.ensure_sparse_workspace(profile)
 
-    projects = profile.get("projects") or {}
-    for name, proj in projects.items():
-        root_path = proj.get("root_path")
-        if not root_path:
-            continue
-        project_path = os.path.join(workspace, root_path)
-        pop = SvnOps(project_path)
+    asyncio.run(_sparse_update_async(workspace, profile))
 
-        # 先 update 根
-        pop._svn(["update"], check=True)
 
-        # 再按规则展开
-        paths = proj.get("paths") or []
-        if not paths:
-            continue
+def _commit_one_project(project_path: str, proj: Dict, message: str) -> bool:
+    # 一次 status 同时用于判断是否有变化和 add / delete
+    lines = _svn_status_lines(project_path)
+    if not _has_changes(lines):
+        return False
 
-        def _depth(p: str) -> int:
-            return p.strip("/").count("/")
+    svn_auto_add_remove(project_path, lines)
 
-        sorted_paths = sorted(paths, key=lambda x: _depth(x["path"]))
-        for item in sorted_paths:
-            rel = item["path"].strip("/")
-            depth = item.get("depth", "infinity")
-            pop._svn(["update", rel, "--depth", depth], check=True)
+    pop = ops_for(project_path)
+    pop._svn(["commit", "-m", message], check=True)
+    return True
 
 
 def sparse_commit(workspace: str, profile: Dict, message: str) -> List[str]:
     """
-    你说的加强版 sparse_commit：只传 profile + message
+    你说的加强版 sparse_commit：只传 profile + message（各 project 并发）
     返回：实际提交的 project 列表（root_path）
     """
-    committed = []
-    projects = profile.get("projects") or {}
-    for name, proj in projects.items():
-        root_path = proj.get("root_path")
-        if not root_path:
-            continue
-        project_path = os.path.join(workspace, root_path)
+    results = _run_per_project(
+        workspace, profile, _commit_one_project, message)
+    return [root_path for root_path, committed in results if committed]
+
+
+def _sln_dir_in_repo(git_dir: str, sln_path: str) -> Optional[str]:
+    """
+    sln 所在目录相对 git_dir 的路径（"/" 分隔）；
+    sln 不在仓库内（或就在仓库根目录）时返回 None。
+    """
+    sln_dir = os.path.dirname(os.path.abspath(sln_path))
+    try:
+        rel = os.path.relpath(sln_dir, os.path.abspath(git_dir))
+    except ValueError:  # Windows 下不同盘符
+        return None
+    if rel == os.curdir or rel.startswith(os.pardir):
+        return None
+    return rel.replace(os.sep, "/")
+
+
+def _default_lfs_include(git_dir: str, sln_path: str) -> Optional[List[str]]:
+    """
+    sln 在 git 仓库内时，只需要 sln 所在目录下的 LFS 文件；
+    否则返回 None（拉取全部 LFS）。
+    """
+    rel = _sln_dir_in_repo(git_dir, sln_path)
+    return [rel + "/**"] if rel else None
 
-        if not svn_has_changes(project_path):
-            continue
 
-        svn_auto_add_remove(project_path)
+def _remote_head_moved(git_dir: str, branch: str, ssh_key: Optional[str]) -> bool:
+    """
+    git sync 前的廉价预判：本地 HEAD 与远端分支头（ls-remote，一次往返）是否不同。
+    仓库不存在 / 查询失败时按"有变化"处理。
+    """
+    if not os.path.isdir(os.path.join(git_dir, ".git")):
+        return True
+    try:
+        local = run_git(["rev-parse", "HEAD"], cwd=git_dir).strip()
+        remote = run_git(
+            ["ls-remote", "origin", f"refs/heads/{branch}"],
+            cwd=git_dir, ssh_key=ssh_key,
+        ).split()
+    except GitCommandError as e:
+        logger.warning("git ls-remote 失败，按有改动处理: %s", e)
+        return True
+    return not remote or remote[0] != local
+
+
+def _abandon_svn_update(fut) -> None:
+    """
+    不再等待后台 SVN 更新：未开始则取消；已开始则让它跑完，失败只记录日志。
+    """
+    if fut.cancel():
+        return
 
-        pop = SvnOps(project_path)
-        pop._svn(["commit", "-m", message], check=True)
-        committed.append(root_path)
+    def _log_error(f):
+        if not f.cancelled() and f.exception() is not None:
+            logger.warning("后台 SVN 更新失败（本次构建已跳过）: %s", f.exception())
+
+    fut.add_done_callback(_log_error)
+
+
+def _changed_files(git_dir: str, git_info: Dict) -> Optional[List[str]]:
+    """
+    本次 git 更新改动的文件（相对 git_dir）。
+    无法判断（首次 clone / diff 失败）时返回 None。
+    """
+    repo = git_info.get("repo") or {}
+    prev, new = repo.get("from"), repo.get("to")
+    if not prev or not new:
+        return None
+
+    try:
+        # --no-renames：移动文件时两端路径都列出，也避免 partial clone 为重命名检测按需拉 blob
+        out = run_git(["diff", "--name-only", "--no-renames", prev, new], cwd=git_dir)
+    except GitCommandError as e:
+        logger.warning("git diff 失败，按有改动处理: %s", e)
+        return None
+    return out.splitlines()
+
+
+def _touches_sources(changed: Optional[List[str]], roots: List[str]) -> bool:
+    """
+    changed 中是否有 roots（相对 git_dir）下的文件；changed 为 None 时按"有改动"处理。
+    """
+    if changed is None:
+        return True
 
-    return committed
+    prefixes = tuple(r.strip("/") + "/" for r in roots)
+    return any(
+        path.startswith(prefixes) or path + "/" in prefixes
+        for path in changed
+    )
+
+
+def _needs_restore(changed: Optional[List[str]], sln_in_repo: bool) -> bool:
+    """
+    只有包引用相关文件变化时才需要 NuGet restore。
+    sln 不在 git 仓库内（改动不可见）或改动未知时总是 restore。
+    """
+    if changed is None or not sln_in_repo:
+        return True
+    for path in changed:
+        path = path.lower()
+        if path.endswith(_RESTORE_INPUT_SUFFIXES) or \
+                path.rpartition("/")[2] in _RESTORE_INPUT_NAMES:
+            return True
+    return False
+
+
+@contextmanager
+def _stage(ctx, name: str):
+    """
+    记录一个阶段的耗时（秒）到 ctx.timings[name]，异常时同样记录。
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ctx.timings[name] = round(time.perf_counter() - t0, 3)
+
+
+def _timings_json(ctx) -> str:
+    return json_util.dumps(ctx.timings).decode("utf-8")
 
 
 def notify_failure(ctx, *, stage: str, err: Exception, git_info: Optional[Dict] = None):
@@ -135,6 +415,7 @@ def notify_failure(ctx, *, stage: str, err: Exception, git_info: Optional[Dict]
     extra = f"[stage={stage}]\n{str(err)}"
     if git_info:
         extra += "\n\n" + format_git_block(git_info, max_commits=20)
+    extra += f"\ntimings={_timings_json(ctx)}"
 
     msg = build_failure_summary(extra=extra)
 
@@ -145,12 +426,17 @@ def notify_failure(ctx, *, stage: str, err: Exception, git_info: Optional[Dict]
 
 
 def notify_success(ctx, *, text: str):
-    msg = build_success_summary(extra=text)
+    msg = build_success_summary(extra=f"{text}\ntimings={_timings_json(ctx)}")
     if ctx.iggchat_token and ctx.iggchat_room_id:
         send_to_group(ctx.iggchat_token, msg,
                       ctx.iggchat_room_id, title="Build Success")
 
 
+def _timed_sparse_update(ctx, workspace: str, profile: Dict):
+    with _stage(ctx, "svn_update"):
+        sparse_update(workspace, profile)
+
+
 def run_csharp_publish(
     *,
     git_repo: str,
@@ -160,42 +446,86 @@ def run_csharp_publish(
     configuration: str,
     force: bool = False,
     ssh_key: Optional[str] = None,
+    shallow: bool = True,
+    blob_filter: Optional[str] = "blob:none",
+    lfs_include: Optional[List[str]] = None,
+    source_roots: Optional[List[str]] = None,
 ):
+    """
+    shallow / blob_filter：只构建最新代码，默认浅克隆 + partial clone，
+    首次同步不拉完整历史和无关文件内容。
+    lfs_include：只拉取这些路径（相对 git_dir）下的 LFS 文件；
+    未指定且 sln 位于 git_dir 内时，默认取 sln 所在目录。
+    source_roots：sln 的源码目录（相对 git_dir，sln 所在目录自动包含）；
+    本次 git 更新没有改动其中任何文件时跳过 SVN 更新 / 编译 / 提交。
+    """
     ctx = init_from_env()
+    if lfs_include is None:
+        lfs_include = _default_lfs_include(git_dir, sln_path)
+    git_info: Optional[Dict] = None
+    svn_pool = ThreadPoolExecutor(max_workers=1)
+    svn_fut = None
+    svn_waited = False
     try:
-        # 1) Git sync
-        git_info = sync_repo_with_info(
-            url=git_repo,
-            dest=git_dir,
-            branch=git_branch,
-            ssh_key=ssh_key,
-            recursive=True,
-            lfs=True,
-        )
+        # 1) Git sync 与 2) SVN sparse update 访问不同服务器、互不依赖：
+        #    远端分支有新提交时，SVN 更新放到后台线程与 git 同步重叠，编译前再等待；
+        #    没有新提交（大概率跳过构建）时不提前启动，跳过路径不为 SVN 付出代价
+        profile = load_sparse_profile(_SVN_PROFILE_JSON)
+        if force or _remote_head_moved(git_dir, git_branch, ssh_key):
+            svn_fut = svn_pool.submit(
+                _timed_sparse_update, ctx, ctx.work_root, profile)
+
+        with _stage(ctx, "git"):
+            git_info = sync_repo_with_info(
+                url=git_repo,
+                dest=git_dir,
+                branch=git_branch,
+                ssh_key=ssh_key,
+                recursive=True,
+                lfs=True,
+                shallow=shallow,
+                blob_filter=blob_filter,
+                lfs_include=lfs_include,
+            )
 
         if (not force) and (not git_info.get("changed", False)):
             notify_success(ctx, text="Git no changes -> skip build/commit")
             return
 
-        # 2) SVN sparse update
-        here = Path(__file__).resolve()
-        px_root = here.parents[1]
-        svn_profile_json = os.path.join(
-            px_root, "configs", "svn_sparse_profile.json")
-        profile = _load_json(svn_profile_json)
-        sparse_update(ctx.work_root, profile)
+        # 改动都不在 sln 的源码目录下 -> 整个构建可跳过
+        changed = _changed_files(git_dir, git_info)
+        roots = list(source_roots or [])
+        sln_dir = _sln_dir_in_repo(git_dir, sln_path)
+        if sln_dir:
+            roots.append(sln_dir)
+        if (not force) and roots and not _touches_sources(changed, roots):
+            notify_success(ctx, text="No relevant changes -> skip build/commit")
+            return
+
+        # 编译依赖 SVN 工作区，等待后台 sparse update 完成（失败在此抛出）；
+        # 预判未启动（ls-remote 之后才有新提交）时在这里补上
+        # svn_wait > 0 说明 SVN 在关键路径上
+        if svn_fut is None:
+            svn_fut = svn_pool.submit(
+                _timed_sparse_update, ctx, ctx.work_root, profile)
+        with _stage(ctx, "svn_wait"):
+            svn_waited = True
+            svn_fut.result()
 
         # 4) C# build verify
         if not ctx.msbuild_path:
             raise WorkflowError("MSBUILD_PATH 未设置（建议 Jenkins 全局环境变量提供）")
 
-        br = build_csharp(
-            ctx.msbuild_path,
-            sln_path,
-            configuration=configuration,
-            restore=True,
-            rebuild=True,
-        )
+        with _stage(ctx, "build"):
+            br = build_csharp(
+                ctx.msbuild_path,
+                sln_path,
+                configuration=configuration,
+                restore=force or _needs_restore(changed, bool(sln_dir)),
+                rebuild=False,
+                parallel=os.cpu_count(),
+                graph=True,
+            )
         if not br.success:
             raise WorkflowError(
                 f"C# build failed: code={br.returncode}\n{br.stderr}")
@@ -208,7 +538,8 @@ def run_csharp_publish(
             f"jenkins_console: {ctx.console_text_url() or '-'}\n"
         )
 
-        committed = sparse_commit(svn_workspace, profile, commit_msg)
+        with _stage(ctx, "svn_commit"):
+            committed = sparse_commit(svn_workspace, profile, commit_msg)
 
         if committed:
             notify_success(ctx, text="SVN committed: " + ", ".join(committed))
@@ -217,8 +548,12 @@ def run_csharp_publish(
 
     except Exception as e:
         logger.exception("workflow failed")
-        notify_failure(ctx, stage="workflow", err=e,
-                       git_info=locals().get("git_info"))
+        notify_failure(ctx, stage="workflow", err=e, git_info=git_info)
         raise
     finally:
+        # 跳过 / 提前失败时不等后台 SVN 更新，也不丢弃它的异常
+        if svn_fut is not None and not svn_waited:
+            _abandon_svn_update(svn_fut)
+        svn_pool.shutdown(wait=False, cancel_futures=True)
         mark_build_end()
+        logger.info("stage timings: %s", _timings_json(ctx))
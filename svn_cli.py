@@ -27,10 +27,10 @@ import argparse
 import logging
 import os
 import sys
-import json
 from typing import List
 
-from modules.vcs.svn_ops import SvnOps, VCSException
+from modules.vcs.svn_ops import SvnOps, VCSException, ops_for
+from modules.vcs.svn_ops import load_sparse_profile as _load_sparse_profile
 
 
 # ----------------------------------------------------------------------
@@ -45,7 +45,7 @@ def build_ops(repo: str) -> SvnOps:
         raise VCSException("缺少 --repo 参数。")
     if not os.path.isdir(repo):
         raise VCSException(f"repo 路径不存在: {repo}")
-    return SvnOps(repo)
+    return ops_for(repo)
 
 
 def load_sparse_profile(profile_path: str) -> dict:
@@ -56,8 +56,25 @@ def load_sparse_profile(profile_path: str) -> dict:
     if not os.path.isfile(profile_path):
         raise VCSException(f"sparse profile 不存在: {profile_path}")
 
-    with open(profile_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return _load_sparse_profile(profile_path)
+
+
+def _format_revisions(buf: List[str], revisions) -> None:
+    """
+    把 RevisionChange 列表格式化为文本行，追加到 buf。
+    """
+    for rev in revisions:
+        buf.append(f"[r{rev.revision}] {rev.author} {rev.date}")
+        buf.append(f"  {rev.message}")
+        buf.extend(f"    {f.action} {f.path}" for f in rev.files)
+
+
+def _write_lines(buf: List[str]) -> None:
+    """
+    一次性输出多行文本：变更列表可能上万行，逐行 print 在 Windows 控制台上很慢。
+    """
+    sys.stdout.write("\n".join(buf) + "\n")
+    sys.stdout.flush()
 
 
 # ----------------------------------------------------------------------
@@ -105,12 +122,9 @@ def cmd_update(args: argparse.Namespace):
             include_diff=False,
             include_externals=True,
         )
-        print("\n本次更新变更列表：")
-        for rev in result.revision_changes:
-            print(f"[r{rev.revision}] {rev.author} {rev.date}")
-            print(f"  {rev.message}")
-            for f in rev.files:
-                print(f"    {f.action} {f.path}")
+        buf = ["\n本次更新变更列表："]
+        _format_revisions(buf, result.revision_changes)
+        _write_lines(buf)
 
 
 def cmd_switch(args: argparse.Namespace):
@@ -142,59 +156,33 @@ def cmd_summary(args: argparse.Namespace):
         include_externals=not args.no_ext,
     )
 
-    print("主仓库变更：")
-    for rev in summary["main"]:
-        print(f"[r{rev.revision}] {rev.author} {rev.date}")
-        print(f"  {rev.message}")
-        for f in rev.files:
-            print(f"    {f.action} {f.path}")
+    buf = ["主仓库变更："]
+    _format_revisions(buf, summary["main"])
 
     if summary["ext"]:
-        print("\nExternal 仓库变更：")
+        buf.append("\nExternal 仓库变更：")
         for url, lst in summary["ext"].items():
-            print(f"\n== {url} ==")
-            for rev in lst:
-                print(f"[r{rev.revision}] {rev.author} {rev.date}")
-                print(f"  {rev.message}")
-                for f in rev.files:
-                    print(f"    {f.action} {f.path}")
+            buf.append(f"\n== {url} ==")
+            _format_revisions(buf, lst)
+
+    _write_lines(buf)
 
 
 # ----------------------------------------------------------------------
-# 主入口
+# 子命令参数
 # ----------------------------------------------------------------------
 
-def main(argv: List[str] = None):
-    if argv is None:
-        argv = sys.argv[1:]
-
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s [%(levelname)s] %(message)s",
-    )
-
-    parser = argparse.ArgumentParser(
-        description="SvnOps 命令行工具"
-    )
-    sub = parser.add_subparsers(dest="cmd")
-
-    # info
-    p = sub.add_parser("info", help="显示 URL 和 revision")
+def _info_args(p: argparse.ArgumentParser):
     p.add_argument("--repo", required=True, help="工作副本路径")
-    p.set_defaults(func=cmd_info)
 
-    # checkout
-    p = sub.add_parser("checkout", help="普通检出")
+
+def _checkout_args(p: argparse.ArgumentParser):
     p.add_argument("--url", required=True, help="仓库 URL")
     p.add_argument("--repo", required=True, help="检出到的本地路径")
     p.add_argument("--revision", default=None, help="目标 revision")
-    p.set_defaults(func=cmd_checkout)
 
-    # ensure-workspace（NEW，唯一的 sparse 入口）
-    p = sub.add_parser(
-        "ensure-workspace",
-        help="确保工作副本符合 sparse profile 描述的状态",
-    )
+
+def _ensure_workspace_args(p: argparse.ArgumentParser):
     p.add_argument("--url", required=True, help="仓库 URL")
     p.add_argument("--repo", required=True, help="工作副本路径")
     p.add_argument(
@@ -202,10 +190,9 @@ def main(argv: List[str] = None):
         required=True,
         help="sparse profile 名称（不含 .json）",
     )
-    p.set_defaults(func=cmd_ensure_workspace)
 
-    # update
-    p = sub.add_parser("update", help="更新到指定版本")
+
+def _update_args(p: argparse.ArgumentParser):
     p.add_argument("--repo", required=True, help="工作副本路径")
     p.add_argument("--revision", default=None, help="目标 revision")
     p.add_argument(
@@ -213,34 +200,24 @@ def main(argv: List[str] = None):
         action="store_true",
         help="更新完成后打印本次变更明细",
     )
-    p.set_defaults(func=cmd_update)
 
-    # switch
-    p = sub.add_parser("switch", help="切换 URL / 分支")
+
+def _switch_args(p: argparse.ArgumentParser):
     p.add_argument("--repo", required=True, help="工作副本路径")
     p.add_argument("--url", required=True, help="目标 URL")
     p.add_argument("--revision", default=None, help="目标 revision")
-    p.set_defaults(func=cmd_switch)
 
-    # clean
-    p = sub.add_parser("clean", help="回退本地修改并 cleanup")
+
+def _clean_args(p: argparse.ArgumentParser):
     p.add_argument("--repo", required=True, help="工作副本路径")
-    p.set_defaults(func=cmd_clean)
 
-    # update-paths
-    p = sub.add_parser(
-        "update-paths",
-        help="按照 JSON 规则更新指定路径到指定版本",
-    )
+
+def _update_paths_args(p: argparse.ArgumentParser):
     p.add_argument("--repo", required=True, help="工作副本路径")
     p.add_argument("--json", required=True, help="路径与版本映射 JSON")
-    p.set_defaults(func=cmd_update_paths)
 
-    # summary
-    p = sub.add_parser(
-        "summary",
-        help="按时间区间收集变更（主仓库 + external）",
-    )
+
+def _summary_args(p: argparse.ArgumentParser):
     p.add_argument("--repo", required=True, help="工作副本路径")
     p.add_argument(
         "--start-time",
@@ -257,9 +234,76 @@ def main(argv: List[str] = None):
         action="store_true",
         help="不收集 external 变更",
     )
-    p.set_defaults(func=cmd_summary)
 
-    args = parser.parse_args(argv)
+
+# 子命令表：name -> (help, 参数构建函数, 处理函数)
+# ensure-workspace 是唯一的 sparse 入口
+COMMANDS = {
+    "info": ("显示 URL 和 revision", _info_args, cmd_info),
+    "checkout": ("普通检出", _checkout_args, cmd_checkout),
+    "ensure-workspace": (
+        "确保工作副本符合 sparse profile 描述的状态",
+        _ensure_workspace_args,
+        cmd_ensure_workspace,
+    ),
+    "update": ("更新到指定版本", _update_args, cmd_update),
+    "switch": ("切换 URL / 分支", _switch_args, cmd_switch),
+    "clean": ("回退本地修改并 cleanup", _clean_args, cmd_clean),
+    "update-paths": (
+        "按照 JSON 规则更新指定路径到指定版本",
+        _update_paths_args,
+        cmd_update_paths,
+    ),
+    "summary": (
+        "按时间区间收集变更（主仓库 + external）",
+        _summary_args,
+        cmd_summary,
+    ),
+}
+
+
+def _build_full_parser() -> argparse.ArgumentParser:
+    """
+    含全部子命令的 parser，仅用于顶层帮助 / 未知子命令的报错。
+    """
+    parser = argparse.ArgumentParser(
+        description="SvnOps 命令行工具"
+    )
+    sub = parser.add_subparsers(dest="cmd")
+    for name, (help_text, add_args, handler) in COMMANDS.items():
+        p = sub.add_parser(name, help=help_text)
+        add_args(p)
+        p.set_defaults(func=handler)
+    return parser
+
+
+# ----------------------------------------------------------------------
+# 主入口
+# ----------------------------------------------------------------------
+
+def main(argv: List[str] = None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(message)s",
+    )
+
+    # 常见路径：argv[0] 就是子命令，只构建这一个子命令的 parser
+    entry = COMMANDS.get(argv[0]) if argv else None
+    if entry is not None:
+        help_text, add_args, handler = entry
+        parser = argparse.ArgumentParser(
+            prog=f"{os.path.basename(sys.argv[0])} {argv[0]}",
+            description=help_text,
+        )
+        add_args(parser)
+        args = parser.parse_args(argv[1:])
+        args.func = handler
+    else:
+        parser = _build_full_parser()
+        args = parser.parse_args(argv)
 
     if not hasattr(args, "func"):
         parser.print_help()